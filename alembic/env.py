@@ -1,17 +1,16 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
-
-from alembic import context
+from sqlalchemy import engine_from_config, pool
 from sqlmodel import SQLModel
 
-from src.models import (
-    Disease,  # noqa: F401
-    Patient,  # noqa: F401
-    Report,  # noqa: F401
-    Reporter,  # noqa: F401
-    User,  # noqa: F401
+from alembic import context
+from src.models import (  # noqa: F401
+    Disease,
+    Patient,
+    Report,
+    ReportRollup,
+    Reporter,
+    User,
 )
 
 # this is the Alembic Config object, which provides
@@ -30,6 +29,13 @@ if config.config_file_name is not None:
 # target_metadata = None
 target_metadata = SQLModel.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # the full-text index (the FTS5 virtual table and its shadow tables)
+    # isn't in the metadata, it's created by hand (see src/models.py)
+    return not (type_ == "table" and name.startswith("disease_fts"))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -53,6 +59,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -79,6 +86,7 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             # SQLite related, https://alembic.sqlalchemy.org/en/latest/batch.html
             render_as_batch=True,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
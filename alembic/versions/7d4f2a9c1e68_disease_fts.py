@@ -0,0 +1,70 @@
+"""disease full-text index
+
+Revision ID: 7d4f2a9c1e68
+Revises: 5b1d8e3a7c92
+Create Date: 2026-10-18 15:48:21.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4f2a9c1e68'
+down_revision: Union[str, Sequence[str], None] = '5b1d8e3a7c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQLite FTS5 index of the symptoms and lab results, kept in sync by the triggers
+# (the same as DISEASE_FTS_DDL in src/models.py at this revision)
+DISEASE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE disease_fts USING fts5(
+        symptoms, lab_results,
+        content='disease', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER disease_fts_insert AFTER INSERT ON disease BEGIN
+        INSERT INTO disease_fts (rowid, symptoms, lab_results)
+        VALUES (new.id, new.symptoms, new.lab_results);
+    END
+    """,
+    """
+    CREATE TRIGGER disease_fts_delete AFTER DELETE ON disease BEGIN
+        INSERT INTO disease_fts (disease_fts, rowid, symptoms, lab_results)
+        VALUES ('delete', old.id, old.symptoms, old.lab_results);
+    END
+    """,
+    """
+    CREATE TRIGGER disease_fts_update
+    AFTER UPDATE OF symptoms, lab_results ON disease BEGIN
+        INSERT INTO disease_fts (disease_fts, rowid, symptoms, lab_results)
+        VALUES ('delete', old.id, old.symptoms, old.lab_results);
+        INSERT INTO disease_fts (rowid, symptoms, lab_results)
+        VALUES (new.id, new.symptoms, new.lab_results);
+    END
+    """,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for statement in DISEASE_FTS_DDL:
+        op.execute(statement)
+    # index the existing diseases
+    op.execute("INSERT INTO disease_fts (disease_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in ('disease_fts_update', 'disease_fts_delete', 'disease_fts_insert'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS disease_fts")
@@ -0,0 +1,101 @@
+"""
+Shared helpers for the benchmarks.
+
+Importing this module points DB_URL at a fresh temporary SQLite file
+(unless DB_URL is already set) before the app is imported.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+PROBE_INTERVAL = 0.002
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="dors-bench-"), "bench.db")
+os.environ.setdefault("DB_URL", f"sqlite:///{DB_FILE}")
+
+import httpx  # noqa: E402
+
+import populate_db  # noqa: E402
+from src import rollup  # noqa: E402
+from src.main import app  # noqa: E402
+from src.models import Report  # noqa: E402
+from src.routers.auth import create_access_token  # noqa: E402
+
+# user from the fixtures (src/tests/data/db_test_data.py)
+USERNAME = "johndoe"
+PASSWORD = "secret"
+
+
+def seed(total_reports=0):
+    """
+    Creates the tables, loads the fixtures and adds `total_reports` extra reports
+    (and counts them into the stats rollup).
+    """
+    populate_db.create_db_and_tables()
+    populate_db.populate()
+    rows = [
+        {
+            "status": "draft",
+            "patient_id": 1 + i % 15,
+            "disease_id": 1 + i % 8,
+            "reporter_id": 1 + i % 5,
+        }
+        for i in range(total_reports)
+    ]
+    with populate_db.engine.begin() as connection:
+        populate_db.insert_rows(connection, Report.__table__, rows)
+    asyncio.run(rollup.main("rebuild"))
+
+
+@asynccontextmanager
+async def client():
+    # httpx doesn't run the app's lifespan (it starts the job queue workers)
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://bench") as api,
+    ):
+        yield api
+
+
+def auth_headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': USERNAME})}"}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def timed(client, url, headers=None, issued=None, method="GET", **kwargs):
+    # latency is measured from the moment the whole batch was issued, the same
+    # way a client that fired all the requests at once would observe it
+    started = issued or time.perf_counter()
+    response = await client.request(method, url, headers=headers, **kwargs)
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def probe(
+    client, done, latencies, url="/healthcheck", headers=None, interval=PROBE_INTERVAL
+):
+    # Keeps pinging the cheap endpoint on a fixed schedule until `done` is set.
+    # Latency is measured from the scheduled time, so a probe that could not
+    # even be sent because the loop was blocked is still accounted for.
+    scheduled = time.perf_counter()
+    while not done.is_set():
+        latencies.append(await timed(client, url, headers, issued=scheduled))
+        scheduled += interval
+        await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+
+
+def print_latencies(name, values):
+    print(
+        f"{name:<18} mean {statistics.mean(values):8.2f} ms"
+        f"  p50 {percentile(values, 50):8.2f} ms"
+        f"  p95 {percentile(values, 95):8.2f} ms"
+        f"  p99 {percentile(values, 99):8.2f} ms"
+    )
@@ -0,0 +1,54 @@
+"""
+Concurrent-request latency benchmark.
+
+Fires a batch of "heavy" list requests (deep `offset` pages) at the API while
+continuously probing the cheap `/healthcheck` endpoint, both through an
+in-process ASGI client. When handlers block the event loop, the probes queue up
+behind the database work and their latency grows with the load.
+
+Usage:
+    python -m benchmarks.concurrency --reports 50000 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+from .common import auth_headers, client, print_latencies, probe, seed, timed
+
+
+async def run(total_reports, concurrency, rounds):
+    headers = auth_headers()
+    heavy, probes = [], []
+
+    async with client() as api:
+        # warm up the connection pool and imports
+        await timed(api, "/api/reports", headers)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            issued = time.perf_counter()
+            done = asyncio.Event()
+            prober = asyncio.create_task(probe(api, done, probes))
+            deep_page = f"/api/reports?offset={total_reports - 20}"
+            heavy += await asyncio.gather(
+                *(timed(api, deep_page, headers, issued) for _ in range(concurrency))
+            )
+            done.set()
+            await prober
+        elapsed = time.perf_counter() - started
+
+    print(f"reports in DB: {total_reports}, concurrency: {concurrency}, rounds: {rounds}")
+    print(f"throughput: {(len(heavy) + len(probes)) / elapsed:.1f} req/s")
+    print_latencies("GET /api/reports", heavy)
+    print_latencies("GET /healthcheck", probes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=50_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    seed(args.reports)
+    asyncio.run(run(args.reports, args.concurrency, args.rounds))
@@ -0,0 +1,69 @@
+"""
+Login storm benchmark.
+
+Sends bursts of POST /token requests (argon2 password verification) while
+probing GET /api/reports/{id} on a fixed schedule, and prints the latency of
+both. Verification blocking the event loop shows up as probe latency.
+
+Usage:
+    python -m benchmarks.login_storm --logins 32 --rounds 5
+"""
+import argparse
+import asyncio
+import time
+
+from .common import (
+    PASSWORD,
+    USERNAME,
+    auth_headers,
+    client,
+    print_latencies,
+    probe,
+    seed,
+    timed,
+)
+
+PROBE_INTERVAL = 0.02
+
+
+async def run(logins, rounds):
+    headers = auth_headers()
+    credentials = {"username": USERNAME, "password": PASSWORD}
+    storm, probes = [], []
+
+    async with client() as api:
+        # warm up (and fill the authenticated user cache)
+        await timed(api, "/api/reports/1", headers)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            issued = time.perf_counter()
+            done = asyncio.Event()
+            prober = asyncio.create_task(
+                probe(api, done, probes, "/api/reports/1", headers, PROBE_INTERVAL)
+            )
+            storm += await asyncio.gather(*(
+                timed(api, "/token", issued=issued, method="POST", data=credentials)
+                for _ in range(logins)
+            ))
+            done.set()
+            await prober
+        elapsed = time.perf_counter() - started
+
+    print(f"logins per burst: {logins}, rounds: {rounds}")
+    print(
+        f"logins: {len(storm) / elapsed:.1f} /s, "
+        f"probes: {len(probes) / elapsed:.1f} /s"
+    )
+    print_latencies("POST /token", storm)
+    print_latencies("GET /api/reports/1", probes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    seed()
+    asyncio.run(run(args.logins, args.rounds))
@@ -0,0 +1,48 @@
+"""
+Sparse fieldsets benchmark.
+
+Times GET /api/reports pages of whole reports (with their reporter, patient
+and disease) against the same pages with only some of the fields
+(`fields=` / `include=`), and prints the sizes of the responses.
+
+Usage:
+    python -m benchmarks.projection --reports 100000
+"""
+import argparse
+import asyncio
+
+from .common import auth_headers, client, print_latencies, seed, timed
+
+PROJECTIONS = {
+    "whole reports": "",
+    "list view": "&fields=status,date_updated,disease.name,disease.category",
+    "IDs and status": "&fields=status",
+    "with disease": "&include=disease",
+}
+
+
+async def run(total_reports, requests, limit):
+    headers = auth_headers()
+
+    async with client() as api:
+        # warm up the connection pool and imports
+        await timed(api, "/api/reports", headers)
+
+        print(f"reports in DB: {total_reports}, page: {limit}, requests: {requests}")
+        for name, params in PROJECTIONS.items():
+            url = f"/api/reports?cursor=&limit={limit}{params}"
+            response = await api.get(url, headers=headers)
+            latencies = [await timed(api, url, headers) for _ in range(requests)]
+            print_latencies(name, latencies)
+            print(f"{'':<18} {len(response.content)} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    seed(args.reports)
+    asyncio.run(run(args.reports, args.requests, args.limit))
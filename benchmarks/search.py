@@ -0,0 +1,90 @@
+"""
+Full-text search benchmark.
+
+Adds diseases with random symptoms and lab results (indexed by the FTS5
+triggers as they're inserted) and times GET /api/search for a rare word,
+a common one, several words and a prefix.
+
+Usage:
+    python -m benchmarks.search --diseases 1000000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+# sets DB_URL, before the app is imported
+from .common import auth_headers, client, print_latencies, seed, timed
+
+# isort: split
+
+import populate_db
+from src.models import Disease
+
+# word -> how often it's picked, the first ones are the common ones
+SYMPTOMS = [
+    "fever", "cough", "headache", "fatigue", "nausea", "rash", "chills",
+    "diarrhoea", "vomiting", "sore throat", "muscle pain", "shortness of breath",
+    "loss of smell", "jaundice", "swollen lymph nodes", "conjunctivitis",
+    "xanthopsia", "haemoptysis",
+]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(SYMPTOMS))]
+LAB_RESULTS = ["PCR positive", "PCR negative", "culture pending", "antibodies found"]
+QUERIES = {
+    "rare word": "haemoptysis",
+    "common word": "fever",
+    "several words": "fever cough rash",
+    "prefix": "vomit*",
+}
+
+
+def seed_diseases(total, batch=50_000):
+    rows = []
+    with Session(populate_db.engine) as session:
+        for i in range(total):
+            rows.append({
+                "name": f"Disease {i}",
+                "category": "viral",
+                "date_detected": datetime(2025, 1, 1),
+                "symptoms": ", ".join(random.choices(SYMPTOMS, WEIGHTS, k=4)),
+                "severity_level": "low",
+                "lab_results": random.choice(LAB_RESULTS),
+                "treatment_status": "ongoing",
+                "created_by": 1,
+            })
+            if len(rows) == batch or i == total - 1:
+                session.execute(insert(Disease), rows)
+                rows = []
+        session.commit()
+
+
+async def run(total_diseases, requests):
+    headers = auth_headers()
+
+    async with client() as api:
+        # warm up the connection pool and imports
+        await timed(api, "/api/search?q=fever", headers)
+
+        print(f"diseases in DB: {total_diseases}, requests: {requests}")
+        for name, query in QUERIES.items():
+            url = f"/api/search?q={query}&limit=20"
+            latencies = [await timed(api, url, headers) for _ in range(requests)]
+            print_latencies(name, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--diseases", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    seed()
+    started = time.perf_counter()
+    seed_diseases(args.diseases)
+    print(f"inserted and indexed in {time.perf_counter() - started:.1f} s")
+    asyncio.run(run(args.diseases, args.requests))
@@ -0,0 +1,84 @@
+"""
+Report serialisation benchmark.
+
+Times turning reports loaded with their relations into the JSON body of
+GET /api/reports, per 1000 reports, without the DB or HTTP parts:
+
+- validated: ReportResponse(**report.model_dump(), ...) per report, then FastAPI
+  validating the list against the response model and rendering a JSONResponse
+  (how the endpoint used to do it)
+- constructed: ReportResponse.model_construct() and pydantic_core.to_json()
+  (report_response() and json_response() in src/routers/api.py)
+
+Usage:
+    python -m benchmarks.serialization --reports 1000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic_core import to_json
+from sqlmodel import Session
+
+# sets DB_URL, before the app is imported
+from .common import print_latencies, seed
+
+# isort: split
+
+import populate_db
+from src.models import ReportResponse
+from src.routers.api import json_response, report_response, select_reports
+
+response_field = create_model_field(
+    "Response", list[ReportResponse], mode="serialization"
+)
+
+
+async def validated(reports):
+    responses = [
+        ReportResponse(**{
+            **report.model_dump(),
+            "reporter": report.reporter,
+            "patient": report.patient,
+            "disease": report.disease,
+        })
+        for report in reports
+    ]
+    content = await serialize_response(field=response_field, response_content=responses)
+    return JSONResponse(content).body
+
+
+async def constructed(reports):
+    responses = [report_response(report) for report in reports]
+    return json_response(to_json(responses)).body
+
+
+async def run(total_reports, rounds):
+    with Session(populate_db.engine) as session:
+        reports = session.exec(select_reports().limit(total_reports)).all()
+
+    print(f"reports serialised: {len(reports)}, rounds: {rounds}")
+    bodies = set()
+    for name, serialise in (("validated", validated), ("constructed", constructed)):
+        latencies = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            body = await serialise(reports)
+            latencies.append(time.perf_counter() - started)
+        bodies.add(body)
+        # ms per 1000 reports
+        print_latencies(name, [x * 1000 * 1000 / len(reports) for x in latencies])
+    print(f"same JSON: {len(bodies) == 1}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.reports)
+    asyncio.run(run(args.reports, args.rounds))
@@ -0,0 +1,41 @@
+"""
+Report statistics benchmark.
+
+Times GET /api/stats served from the rollup table against the same counts
+computed from the report/disease tables (a date filter forces that path).
+The rollup has a row per day × category × severity × status, so its latency
+doesn't depend on the number of reports.
+
+Usage:
+    python -m benchmarks.stats --reports 100000
+"""
+import argparse
+import asyncio
+
+from .common import auth_headers, client, print_latencies, seed, timed
+
+
+async def run(total_reports, requests):
+    headers = auth_headers()
+
+    async with client() as api:
+        # warm up the connection pool and imports
+        await timed(api, "/api/stats", headers)
+
+        print(f"reports in DB: {total_reports}, requests: {requests}")
+        for name, url in (
+            ("rollup", "/api/stats?period=week"),
+            ("GROUP BY reports", "/api/stats?period=week&date_from=1900-01-01"),
+        ):
+            latencies = [await timed(api, url, headers) for _ in range(requests)]
+            print_latencies(name, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.reports)
+    asyncio.run(run(args.reports, args.requests))
@@ -0,0 +1,302 @@
+"""
+API benchmark suite.
+
+Seeds a synthetic dataset (see populate_db.py) and drives every endpoint through
+the in-process ASGI client, `--concurrency` requests in flight at a time. Prints
+the throughput, latency percentiles and SQL statements per request (counted by
+the app's /metrics) of each one. The results can be saved as JSON (`--json`)
+and compared with a saved run (`--compare`, exits with 1 on a regression).
+
+Usage:
+    python -m benchmarks.suite --reports 1000000 --json before.json
+    python -m benchmarks.suite --reports 1000000 --compare before.json
+    python -m benchmarks.suite --only "/api/reports/{id}" --requests 1000
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pydantic_core import to_json
+
+# sets DB_URL, before the app is imported
+from .common import PASSWORD, USERNAME, auth_headers, client, percentile, seed
+
+# isort: split
+
+import populate_db
+from populate_db import START, SYMPTOMS, disease_row, patient_row, reporter_row
+from src import rollup
+
+# the sums of the SQL statements per route (in /metrics)
+QUERIES = re.compile(r"^http_request_db_queries_sum\{(.*)\} (\S+)$", re.M)
+# reports created with every POST /api/reports/bulk
+BULK_SIZE = 100
+
+
+def body(row):
+    # the API's JSON of a dataset row (enums by value, ISO dates)
+    return json.loads(to_json(row))
+
+
+def scenarios(ids):
+    """
+    Endpoint -> function(rng) returning the request's arguments (method, url, ...),
+    `ids` are the ID ranges of the dataset (see populate_db.generate).
+    The reads go first, the writes change the dataset.
+    """
+    reports, reporters = ids["reports"], ids["reporters"]
+    patients, diseases = ids["patients"], ids["diseases"]
+    # drafts (see populate_db.py), from the newest, each is deleted only once
+    drafts = iter(range(reports[-1] // 4 * 4, reports[0] - 1, -4))
+    list_view = "status,date_updated,disease.name,disease.category"
+
+    def new_report(rng):
+        return {
+            "status": "Draft",
+            "patient_id": rng.choice(patients),
+            "disease_id": rng.choice(diseases),
+        }
+
+    def day(rng):
+        date_from = START + timedelta(days=rng.randrange(2 * 365))
+        date_to = date_from + timedelta(days=1)
+        return f"date_from={date_from:%Y-%m-%d}&date_to={date_to:%Y-%m-%d}"
+
+    def update(relation, ids, row):
+        def make_request(rng):
+            id = rng.choice(ids)
+            return {
+                "method": "POST",
+                "url": f"/api/reports/{id}/{relation}",
+                "json": body(row(id, rng)),
+            }
+        return make_request
+
+    return {
+        "GET /healthcheck": lambda rng: {"url": "/healthcheck"},
+        "GET /api/reports": lambda rng: {
+            "url": f"/api/reports?offset={rng.randrange(100) * 20}",
+        },
+        "GET /api/reports cursor": lambda rng: {"url": "/api/reports?cursor="},
+        "GET /api/reports filtered": lambda rng: {
+            "url": "/api/reports?cursor=&status=Submitted"
+            f"&reporter_id={rng.choice(reporters)}",
+        },
+        "GET /api/reports fields": lambda rng: {
+            "url": f"/api/reports?cursor=&limit=100&fields={list_view}",
+        },
+        "GET /api/reports/{id}": lambda rng: {
+            "url": f"/api/reports/{rng.choice(reports)}",
+        },
+        "GET /api/reports/recent": lambda rng: {"url": "/api/reports/recent"},
+        "GET /api/reports/{id}/reporter": lambda rng: {
+            "url": f"/api/reports/{rng.choice(reporters)}/reporter",
+        },
+        "GET /api/reports/{id}/patient": lambda rng: {
+            "url": f"/api/reports/{rng.choice(patients)}/patient",
+        },
+        "GET /api/reports/{id}/disease": lambda rng: {
+            "url": f"/api/reports/{rng.choice(diseases)}/disease",
+        },
+        "GET /api/reports/export": lambda rng: {
+            "url": f"/api/reports/export?{day(rng)}",
+        },
+        "GET /api/stats": lambda rng: {"url": "/api/stats?period=week"},
+        "GET /api/search": lambda rng: {
+            "url": f"/api/search?q={rng.choice(SYMPTOMS)}",
+        },
+        "GET /metrics": lambda rng: {"url": "/metrics"},
+        "POST /api/reports": lambda rng: {
+            "method": "POST", "url": "/api/reports", "json": new_report(rng),
+        },
+        "POST /api/reports/bulk": lambda rng: {
+            "method": "POST",
+            "url": "/api/reports/bulk",
+            "json": [{"report": new_report(rng)} for _ in range(BULK_SIZE)],
+        },
+        "PUT /api/reports/{id}": lambda rng: {
+            "method": "PUT",
+            "url": f"/api/reports/{rng.choice(reports)}",
+            "json": {"status": "Draft"},
+        },
+        "DELETE /api/reports/{id}": lambda rng: {
+            "method": "DELETE", "url": f"/api/reports/{next(drafts)}",
+        },
+        "POST /api/reports/{id}/reporter": update("reporter", reporters, reporter_row),
+        "POST /api/reports/{id}/patient": update("patient", patients, patient_row),
+        "POST /api/reports/{id}/disease": update(
+            "disease", diseases, lambda id, rng: disease_row(id, rng, reporters)
+        ),
+        "POST /token": lambda rng: {
+            "method": "POST",
+            "url": "/token",
+            "data": {"username": USERNAME, "password": PASSWORD},
+        },
+    }
+
+
+async def total_queries(api):
+    """
+    SQL statements the app has executed so far (for all the requests).
+    """
+    response = await api.get("/metrics")
+    return sum(
+        float(total)
+        for labels, total in QUERIES.findall(response.text)
+        if 'route="/metrics"' not in labels
+    )
+
+
+async def drive(api, headers, make_request, requests, concurrency, rng):
+    """
+    Sends `requests` requests, `concurrency` at a time, returns their stats.
+    """
+    latencies, sizes = [], []
+    statuses = Counter()
+    pending = iter(range(requests))
+
+    async def worker():
+        for _ in pending:
+            request = {"method": "GET", **make_request(rng)}
+            started = time.perf_counter()
+            response = await api.request(headers=headers, **request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+            sizes.append(len(response.content))
+
+    queries = await total_queries(api)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries = await total_queries(api) - queries
+
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": requests / elapsed,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "queries": queries / requests,
+        "bytes": statistics.mean(sizes),
+    }
+
+
+def print_result(name, result):
+    print(
+        f"{name:<34} {result['rps']:8.1f} req/s"
+        f"  p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}"
+        f"  p99 {result['p99_ms']:8.2f} ms"
+        f"  {result['queries']:5.1f} queries  {result['bytes']:9.0f} B"
+        f"  {result['errors']} errors"
+    )
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the changes from the baseline's results, returns the endpoints that got
+    slower (throughput or p95 by more than `threshold` %) or need more queries.
+    """
+    regressions = []
+    meta = baseline["meta"]
+    print(f"\nchanges from the run of {meta['started']} (commit {meta['commit']})")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        rps = (result["rps"] / before["rps"] - 1) * 100
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100
+        more_queries = result["queries"] > before["queries"] + 0.05
+        regressed = rps < -threshold or p95 > threshold or more_queries
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<34} req/s {rps:+7.1f} %  p95 {p95:+7.1f} %"
+            f"  queries {before['queries']:.1f} -> {result['queries']:.1f}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def run(ids, args):
+    headers = auth_headers()
+    rng = random.Random(args.seed)
+    results = {}
+
+    async with client() as api:
+        # warm up the connection pool and imports
+        await api.get("/api/reports", headers=headers)
+
+        for name, make_request in scenarios(ids).items():
+            if args.only and not any(only in name for only in args.only):
+                continue
+            results[name] = await drive(
+                api, headers, make_request, args.requests, args.concurrency, rng
+            )
+            print_result(name, results[name])
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--only", action="append", help="endpoints containing it (can be repeated)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="of the random data")
+    parser.add_argument("--json", help="save the results into this file")
+    parser.add_argument("--compare", help="results (JSON) of an earlier run")
+    parser.add_argument(
+        "--threshold", type=float, default=10, help="%% worse counted as a regression"
+    )
+    args = parser.parse_args()
+
+    meta = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "reports": args.reports,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+    }
+    started = time.perf_counter()
+    seed()
+    ids = populate_db.generate(args.reports, seed=args.seed)
+    asyncio.run(rollup.main("rebuild"))
+    print(f"seeded {args.reports} reports in {time.perf_counter() - started:.1f} s")
+    print(f"concurrency: {args.concurrency}, requests per endpoint: {args.requests}")
+    results = asyncio.run(run(ids, args))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"meta": meta, "results": results}, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            sys.exit(1)
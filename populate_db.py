@@ -1,46 +1,280 @@
-from datetime import datetime as dt
-from os import getenv
-from sqlmodel import Session, SQLModel, create_engine
+"""
+Fills the DB (DB_URL) with the fixtures and, optionally, synthetic data.
 
+The fixtures are the ones of the tests (src/tests/data/db_test_data.py).
+The synthetic reporters, patients, diseases and reports are shaped like them,
+with unique usernames, e-mails and medical record numbers, random relations
+and dates, at any scale. Reports with an ID divisible by 4 are drafts.
+Every table is loaded with executemany in chunks of --batch rows, in a single
+transaction, and the rows/s are printed.
+
+Usage:
+    python populate_db.py                                  # the fixtures
+    python populate_db.py --reports 1000000                # + 1M reports
+    python populate_db.py --no-fixtures --reports 100000   # add to a filled DB
+"""
+import argparse
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from enum import Enum as PyEnum
+from itertools import chain, islice
+
+from sqlalchemy import DateTime, Enum, func, insert, select
+from sqlmodel import SQLModel
+
+from src import rollup
+from src.db import engine
+from src.models import Disease, Patient, Report, Reporter
 from src.tests.data.db_test_data import diseases, patients, reporters, reports
-from src.models import (Disease, Patient, Reporter, Report)
 
-DB_URL = getenv("DB_URL")
+# rows per executemany
+BATCH = 50_000
 
-engine = create_engine(DB_URL, echo=True)
+# synthetic rows per report
+REPORTERS_PER_REPORT = 1 / 1000
+PATIENTS_PER_REPORT = 1 / 4
+DISEASES_PER_REPORT = 1 / 50
+
+STATUSES = ("draft", "submitted", "under_review", "approved")
+SYMPTOMS = [
+    "fever", "cough", "headache", "fatigue", "nausea", "rash", "chills",
+    "vomiting", "sore throat", "muscle pain", "shortness of breath", "jaundice",
+]
+# the dates are spread over the PERIOD from START
+START = datetime(2024, 1, 1)
+PERIOD = timedelta(days=2 * 365)
 
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 
+def templates(model, fixtures):
+    """
+    The fixtures without their IDs and dates, with the enums as members.
+    """
+    enums = {
+        column.name: column.type.enum_class
+        for column in model.__table__.columns
+        if isinstance(column.type, Enum) and column.type.enum_class is not None
+    }
+    return [
+        {
+            name: enums[name][value] if name in enums else value
+            for name, value in fixture.items()
+            if name != "id" and not name.startswith("date_")
+        }
+        for fixture in fixtures
+    ]
+
+
+REPORTERS = templates(Reporter, reporters)
+PATIENTS = templates(Patient, patients)
+DISEASES = templates(Disease, diseases)
+
+
+def random_date(rng, start=START, period=PERIOD):
+    return start + period * rng.random()
+
+
+def pick(rng, ids):
+    # rng.choice() of a range, without its checks (called 3 times per report)
+    return ids[int(rng.random() * len(ids))]
+
+
+def reporter_row(id, rng):
+    return {
+        **REPORTERS[id % len(REPORTERS)],
+        "id": id,
+        "username": f"reporter{id}",
+        "email": f"reporter{id}@example.com",
+        # (one of the fixtures' isn't valid)
+        "phone_number": f"+4479{id % 10**8:08d}",
+        "hashed_password": None,
+        "date_registration": random_date(rng),
+    }
+
+
+def patient_row(id, rng):
+    return {
+        **PATIENTS[id % len(PATIENTS)],
+        "id": id,
+        "medical_record_number": id,
+        "date_of_birth": random_date(rng, datetime(1940, 1, 1), timedelta(days=80 * 365)),
+    }
+
+
+def disease_row(id, rng, reporter_ids):
+    date_created = random_date(rng)
+    return {
+        **DISEASES[id % len(DISEASES)],
+        "id": id,
+        "symptoms": ", ".join(rng.sample(SYMPTOMS, 3)),
+        "created_by": pick(rng, reporter_ids),
+        "updated_by": None,
+        "date_detected": date_created - timedelta(days=rng.randrange(30)),
+        "date_created": date_created,
+        "date_updated": date_created,
+    }
+
+
+def report_row(id, rng, ids):
+    date_created = random_date(rng)
+    return {
+        "id": id,
+        "status": STATUSES[id % len(STATUSES)],
+        "date_created": date_created,
+        "date_updated": date_created + timedelta(days=30) * rng.random(),
+        "reporter_id": pick(rng, ids["reporters"]),
+        "patient_id": pick(rng, ids["patients"]),
+        "disease_id": pick(rng, ids["diseases"]),
+        "updated_by": None,
+    }
+
+
+def sqlite_converter(column):
+    """
+    The function converting the column's values into what SQLAlchemy stores
+    in SQLite, None if they are stored as they are.
+    """
+    if isinstance(column.type, DateTime):
+        # YYYY-MM-DD HH:MM:SS.ffffff, without the time zone
+        return lambda value: value and value.isoformat(" ", "microseconds")[:26]
+    if isinstance(column.type, Enum):
+        return lambda value: value.name if isinstance(value, PyEnum) else value
+    return None
+
+
+def default_values(default, count):
+    # a column's default (a value or a function, e.g. datetime.now) for `count` rows
+    if default.is_callable:
+        return [default.arg(None) for _ in range(count)]
+    return [default.arg] * count
+
+
+def insert_rows(connection, table, rows, batch=BATCH):
+    """
+    Inserts the rows (dicts) with executemany, `batch` rows at a time.
+    Returns how many there were.
+
+    On SQLite the values are converted here and handed to the driver, SQLAlchemy's
+    conversion of every single value takes longer than the INSERTs themselves.
+    """
+    rows = iter(rows)
+    total = 0
+    while chunk := list(islice(rows, batch)):
+        total += len(chunk)
+        if connection.dialect.name != "sqlite":
+            connection.execute(insert(table), chunk)
+            continue
+
+        keys = list(dict.fromkeys(chain.from_iterable(chunk)))
+        columns = [[row.get(key) for row in chunk] for key in keys]
+        # the Python side defaults of the missing columns, Core would add them too
+        for column in table.columns:
+            if column.key not in keys and column.default is not None:
+                keys.append(column.key)
+                columns.append(default_values(column.default, len(chunk)))
+        # converted column by column, only the columns that need it
+        for i, key in enumerate(keys):
+            convert = sqlite_converter(table.c[key])
+            if convert is not None:
+                columns[i] = map(convert, columns[i])
+        params = list(zip(*columns, strict=True))
+        quote = connection.dialect.identifier_preparer.quote
+        connection.exec_driver_sql(
+            f"INSERT INTO {quote(table.name)} ({', '.join(map(quote, keys))})"
+            f" VALUES ({', '.join('?' * len(keys))})",
+            params,
+        )
+    return total
+
+
+@contextmanager
+def without_indexes(connection, table):
+    """
+    Drops the table's indexes and creates them again at the end, one sort
+    per index is much faster than inserting many rows into every B-tree.
+    """
+    for index in table.indexes:
+        index.drop(connection)
+    yield
+    for index in table.indexes:
+        index.create(connection)
+
+
 def populate():
-    with Session(engine) as session:
-        try:
-            for model, entities in (
-                (Disease, diseases),
-                (Patient, patients),
-                (Reporter, reporters),
-                (Report, reports),
-            ):
-                for entity in entities:
-                    entity = {
-                        k: (dt.fromisoformat(v) if k.startswith("date_") and v else v)
-                        for k, v in entity.items()
-                    }
-                    session.add(model(
-                        **entity,
-                    ))
-                    # session.commit()
-
-            session.commit()
-        except Exception:
-            session.rollback()
-            raise
-        else:
-            print("All done!")
+    with engine.begin() as connection:
+        for model, entities in (
+            (Reporter, reporters),
+            (Patient, patients),
+            (Disease, diseases),
+            (Report, reports),
+        ):
+            insert_rows(connection, model.__table__, (
+                {
+                    k: (datetime.fromisoformat(v) if k.startswith("date_") and v else v)
+                    for k, v in entity.items()
+                }
+                for entity in entities
+            ))
+    print("All done!")
+
+
+def generate(total_reports, batch=BATCH, seed=0):
+    """
+    Adds `total_reports` synthetic reports, and the reporters, patients and
+    diseases for them, after the rows already in the DB. Prints the rows/s.
+    Returns their IDs (ranges) by table: reporters, patients, diseases, reports.
+    """
+    rng = random.Random(seed)
+
+    with engine.begin() as connection:
+        def next_ids(model, count):
+            first = (connection.scalar(select(func.max(model.id))) or 0) + 1
+            return range(first, first + max(1, round(count)))
+
+        ids = {
+            "reporters": next_ids(Reporter, total_reports * REPORTERS_PER_REPORT),
+            "patients": next_ids(Patient, total_reports * PATIENTS_PER_REPORT),
+            "diseases": next_ids(Disease, total_reports * DISEASES_PER_REPORT),
+            "reports": next_ids(Report, total_reports),
+        }
+        started = time.perf_counter()
+        for model, rows in (
+            (Reporter, (reporter_row(id, rng) for id in ids["reporters"])),
+            (Patient, (patient_row(id, rng) for id in ids["patients"])),
+            (Disease, (disease_row(id, rng, ids["reporters"]) for id in ids["diseases"])),
+            (Report, (report_row(id, rng, ids) for id in ids["reports"])),
+        ):
+            table_started = time.perf_counter()
+            with without_indexes(connection, model.__table__):
+                count = insert_rows(connection, model.__table__, rows, batch)
+            print_rate(model.__tablename__, count, table_started)
+        print_rate("total", sum(map(len, ids.values())), started)
+
+    return ids
+
+
+def print_rate(name, rows, started):
+    elapsed = time.perf_counter() - started
+    print(f"{name:<9} {rows:>10} rows in {elapsed:6.1f} s ({rows / elapsed:,.0f} rows/s)")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=0, help="synthetic reports to add")
+    parser.add_argument("--batch", type=int, default=BATCH, help="rows per executemany")
+    parser.add_argument("--seed", type=int, default=0, help="of the random data")
+    parser.add_argument("--no-fixtures", action="store_true", help="don't load them")
+    args = parser.parse_args()
+
     create_db_and_tables()
-    populate()
+    if not args.no_fixtures:
+        populate()
+    if args.reports:
+        generate(args.reports, args.batch, args.seed)
+    asyncio.run(rollup.main("rebuild"))
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import monotonic, time
+
+from .helpers import connect_local_sqlite
+
+# SQLiteBytesCache's entries and their size, in its cache_size table
+CACHE_SIZE_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN"
+    " UPDATE cache_size SET entries = entries + 1, bytes = bytes + length(new.value);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value ON cache BEGIN"
+    " UPDATE cache_size SET bytes = bytes + length(new.value) - length(old.value);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN"
+    " UPDATE cache_size SET entries = entries - 1, bytes = bytes - length(old.value);"
+    " END",
+)
+
+
+class TTLCache:
+    """
+    Simple LRU cache, entries expire `ttl` seconds after they were set.
+
+    It's per process (every uvicorn worker has its own copy),
+    so the TTL is what bounds how stale an entry can get.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+
+        if item is None or item[0] < monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value):
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class BytesCache(ABC):
+    """
+    Interface of the caches for serialised (bytes) values, e.g. response payloads.
+
+    All the methods are coroutines (get, set and invalidate are on the requests'
+    path, stats on /metrics'), so a backend doing I/O doesn't block the event loop.
+    """
+
+    @abstractmethod
+    async def get(self, key):
+        ...
+
+    @abstractmethod
+    async def set(self, key, value: bytes):
+        ...
+
+    @abstractmethod
+    async def invalidate(self, *keys):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    async def stats(self):
+        ...
+
+
+class MemoryBytesCache(BytesCache):
+    """
+    LRU cache bounded by the total size of the values, entries expire after `ttl`.
+
+    Per process, like TTLCache, so an entry invalidated in one worker
+    can still be served by the others until it expires.
+    """
+
+    def __init__(self, maxbytes: int, ttl: float):
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    async def get(self, key):
+        item = self._data.get(key)
+
+        if item is None or item[0] < monotonic():
+            if item is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    async def set(self, key, value):
+        self._drop(key)
+        if len(value) > self.maxbytes:
+            return
+
+        self._data[key] = (monotonic() + self.ttl, value)
+        self.bytes += len(value)
+
+        while self.bytes > self.maxbytes:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    async def invalidate(self, *keys):
+        for key in keys:
+            self._drop(key)
+
+    def _drop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.bytes -= len(item[1])
+
+    async def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    async def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "maxbytes": self.maxbytes,
+        }
+
+
+class SQLiteBytesCache(BytesCache):
+    """
+    Cache kept in a SQLite file, shared by all the workers (processes) of the host.
+    A local stand-in for a shared cache server, with the same interface.
+
+    The queries run in a thread (one at a time per instance). The number of
+    entries and their size are kept up to date by triggers (in the file, as all
+    the workers change it), when it grows over `maxbytes`, the entries closest
+    to expiring are dropped.
+    """
+
+    def __init__(self, path: str, maxbytes: int, ttl: float):
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = connect_local_sqlite(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), "
+            "entries INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO cache_size"
+            " SELECT 0, count(*), total(length(value)) FROM cache"
+        )
+        for trigger in CACHE_SIZE_TRIGGERS:
+            self._db.execute(trigger)
+
+    def _execute(self, statement, parameters=()):
+        with self._lock:
+            return self._db.execute(statement, parameters).fetchone()
+
+    async def get(self, key):
+        row = await asyncio.to_thread(
+            self._execute,
+            "SELECT value FROM cache WHERE key = ? AND expires >= ?",
+            (key, time()),
+        )
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return row[0]
+
+    async def set(self, key, value):
+        if len(value) > self.maxbytes:
+            await self.invalidate(key)
+            return
+        await asyncio.to_thread(self._set, key, value, time())
+
+    def _set(self, key, value, now):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE"
+                " SET value = excluded.value, expires = excluded.expires",
+                (key, value, now + self.ttl),
+            )
+            (total,) = self._db.execute("SELECT bytes FROM cache_size").fetchone()
+            if total > self.maxbytes:
+                self._db.execute("DELETE FROM cache WHERE expires < ?", (now,))
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM cache ORDER BY expires LIMIT "
+                    "(SELECT entries / 4 + 1 FROM cache_size))"
+                )
+
+    async def invalidate(self, *keys):
+        # a single statement (and transaction) for all of them
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM cache WHERE key IN (SELECT value FROM json_each(?))",
+            (json.dumps(keys),),
+        )
+
+    async def clear(self):
+        await asyncio.to_thread(self._execute, "DELETE FROM cache")
+
+    async def stats(self):
+        size, total = await asyncio.to_thread(
+            self._execute, "SELECT entries, bytes FROM cache_size"
+        )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": size,
+            "bytes": int(total),
+            "maxbytes": self.maxbytes,
+        }
+
+
+def make_bytes_cache(backend: str, maxbytes: int, ttl: float, path: str = ""):
+    """
+    The cache for the `backend` name: memory, sqlite or none (nothing is stored).
+    """
+    if backend == "sqlite":
+        return SQLiteBytesCache(path, maxbytes, ttl)
+    if backend == "memory":
+        return MemoryBytesCache(maxbytes, ttl)
+    if backend == "none":
+        return MemoryBytesCache(0, ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
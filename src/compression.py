@@ -0,0 +1,231 @@
+"""
+Compression of the responses (Content-Encoding), negotiated with the request's
+Accept-Encoding.
+
+gzip is always available, br and zstd only with the brotli / zstandard packages
+installed. Only the COMPRESSION_TYPES are compressed, and only when they have at
+least COMPRESSION_MIN_SIZE bytes (streamed ones always, their size isn't known).
+"""
+import zlib
+from collections import Counter
+from time import thread_time
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .constants import (
+    COMPRESSION,
+    COMPRESSION_BR_QUALITY,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_TYPES,
+    COMPRESSION_ZSTD_LEVEL,
+)
+from .helpers import logger
+from .metrics import compression_cpu, compression_ratio
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logger.getChild(__name__)
+
+# totals of this worker (for /metrics)
+compression_stats = Counter({
+    "compressed": 0,
+    "too_small": 0,
+    "not_accepted": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+})
+
+
+# Every encoder is a function encode(data, last) returning the data compressed
+# so far, flushed (a streamed part is sent as soon as it's ready).
+def gzip_encoder():
+    # 16 + MAX_WBITS: with the gzip header and trailer (not a zlib stream)
+    compressor = zlib.compressobj(
+        COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+
+    def encode(data, last):
+        return compressor.compress(data) + compressor.flush(
+            zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        )
+    return encode
+
+
+def brotli_encoder():
+    compressor = brotli.Compressor(quality=COMPRESSION_BR_QUALITY)
+
+    def encode(data, last):
+        return compressor.process(data) + (
+            compressor.finish() if last else compressor.flush()
+        )
+    return encode
+
+
+def zstd_encoder():
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def encode(data, last):
+        return compressor.compress(data) + compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if last
+            else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+    return encode
+
+
+ENCODERS = {"gzip": gzip_encoder}
+if brotli is not None:
+    ENCODERS["br"] = brotli_encoder
+if zstandard is not None:
+    ENCODERS["zstd"] = zstd_encoder
+
+
+def split_setting(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+def negotiate(accept_encoding, encodings):
+    """
+    The encoding of `encodings` the client prefers (the highest q in Accept-Encoding),
+    of equally preferred ones the first. None when it accepts none of them.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses the response bodies with the best encoding both sides support.
+    The compression ratios and CPU time are recorded per route (see /metrics).
+    """
+
+    def __init__(self, app, encodings=None, minimum_size=None, media_types=None):
+        self.app = app
+        wanted = split_setting(COMPRESSION) if encodings is None else encodings
+        self.encodings = [name for name in wanted if name in ENCODERS]
+        unavailable = set(wanted) - set(self.encodings) - {"none"}
+        if unavailable:
+            logger.info("Compression not available: %s", ", ".join(sorted(unavailable)))
+        self.minimum_size = (
+            COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        )
+        self.media_types = set(
+            split_setting(COMPRESSION_TYPES) if media_types is None else media_types
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        responder = CompressingResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressingResponder:
+    """
+    send() of a single response, compressing the body if it should be.
+    """
+
+    def __init__(self, middleware, scope, send, encoding):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        # http.response.start is held back until the first part of the body
+        self.start = None
+        self.encode = None
+        self.size = 0
+        self.compressed_size = 0
+        self.cpu_seconds = 0.0
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+        elif message["type"] == "http.response.body" and self.start is not None:
+            start, self.start = self.start, None
+            await self.send_first(start, message)
+        elif message["type"] == "http.response.body" and self.encode is not None:
+            await self._send(self.compress(message))
+        else:
+            await self._send(message)
+
+    async def send_first(self, start, message):
+        headers = MutableHeaders(scope=start)
+        media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        body = message.get("body", b"")
+        streamed = message.get("more_body", False)
+
+        if (
+            media_type in self.middleware.media_types
+            and "content-encoding" not in headers
+            and start["status"] not in (204, 304)
+        ):
+            # the response depends on Accept-Encoding, even if this one isn't compressed
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is None:
+                compression_stats["not_accepted"] += 1
+            elif not streamed and len(body) < self.middleware.minimum_size:
+                compression_stats["too_small"] += 1
+            else:
+                self.encode = ENCODERS[self.encoding]()
+                message = self.compress(message)
+                headers["Content-Encoding"] = self.encoding
+                if streamed:
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(message["body"]))
+
+        await self._send(start)
+        await self._send(message)
+
+    def compress(self, message):
+        body = message.get("body", b"")
+        last = not message.get("more_body", False)
+
+        started = thread_time()
+        compressed = self.encode(body, last)
+        self.cpu_seconds += thread_time() - started
+        self.size += len(body)
+        self.compressed_size += len(compressed)
+        if last:
+            self.record()
+
+        return {**message, "body": compressed}
+
+    def record(self):
+        route = self.scope.get("route")
+        labels = (self.encoding, route.path if route is not None else "unmatched")
+        compression_ratio.observe(self.size / max(self.compressed_size, 1), *labels)
+        compression_cpu.observe(self.cpu_seconds, *labels)
+        compression_stats["compressed"] += 1
+        compression_stats["bytes_in"] += self.size
+        compression_stats["bytes_out"] += self.compressed_size
@@ -1,5 +1,86 @@
-from os import getenv
+from os import cpu_count, getenv, path
+from tempfile import gettempdir
 
 ACCESS_TOKEN_EXPIRE_MINUTES = getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 50)
 ALGORITHM = getenv("ALGORITHM", "HS256")
 SECRET_KEY = getenv("SECRET_KEY", "somethingR43IIyS1lley")
+# the largest page of reports that can be requested at once
+MAX_PAGE_SIZE = int(getenv("MAX_PAGE_SIZE", 1000))
+# authenticated users are cached (per worker) for that many seconds, a reporter
+# update drops the entry of its own worker only, the other workers keep
+# authenticating the old one (e.g. its old username) until it expires
+USER_CACHE_TTL = float(getenv("USER_CACHE_TTL", 10))
+USER_CACHE_SIZE = int(getenv("USER_CACHE_SIZE", 1024))
+# password hashes (argon2) computed at the same time, per worker,
+# by default half of the CPUs are left for the event loop
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", max(1, cpu_count() // 2)))
+# POST /api/reports/bulk limits
+BULK_MAX_ITEMS = int(getenv("BULK_MAX_ITEMS", 10000))
+BULK_CHUNK_SIZE = int(getenv("BULK_CHUNK_SIZE", 500))
+# rows fetched from the DB cursor at once while exporting reports
+EXPORT_BATCH_SIZE = int(getenv("EXPORT_BATCH_SIZE", 1000))
+# SQL statements are logged only in debug mode
+DEBUG = getenv("DEBUG", "").lower() in ("1", "true", "yes")
+# DB connection pool (per worker, and per engine - sync and async)
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", 30))
+# seconds after which a connection is replaced, -1 keeps them forever
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", 1800))
+# SQLite only: ms to wait for a lock, bytes memory mapped, cache size (-KiB)
+SQLITE_BUSY_TIMEOUT = int(getenv("SQLITE_BUSY_TIMEOUT", 5000))
+SQLITE_MMAP_SIZE = int(getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(getenv("SQLITE_CACHE_SIZE", -64000))
+# read replicas of DB_URL (comma separated URLs), the GET endpoints read from them
+DB_REPLICA_URLS = getenv("DB_REPLICA_URLS", "")
+# after its own write a client reads from the primary for that many seconds,
+# it should be longer than the replicas lag behind
+DB_STICKY_SECONDS = float(getenv("DB_STICKY_SECONDS", 5))
+# uvicorn's worker processes (its --workers defaults to it)
+WEB_CONCURRENCY = int(getenv("WEB_CONCURRENCY", 1))
+# cache of the serialised single record reads (GET /api/reports/{id}...):
+# memory (per worker, a write drops only its own worker's entries, the other
+# workers serve theirs until RESPONSE_CACHE_TTL), sqlite (a file shared by the
+# workers, the default with more than one) or none
+RESPONSE_CACHE = getenv("RESPONSE_CACHE", "memory" if WEB_CONCURRENCY == 1 else "sqlite")
+RESPONSE_CACHE_TTL = float(getenv("RESPONSE_CACHE_TTL", 30))
+RESPONSE_CACHE_BYTES = int(getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+RESPONSE_CACHE_PATH = getenv(
+    "RESPONSE_CACHE_PATH", path.join(gettempdir(), "dors-response-cache.db")
+)
+# GET /api/search ranks (bm25) only this many of the most recently added matches (the
+# older ones follow them newest first), ranking every match of a common word in
+# millions of rows would take seconds
+SEARCH_RANK_WINDOW = int(getenv("SEARCH_RANK_WINDOW", 5_000))
+# response compression, the encodings in the order of preference (br and zstd
+# need the brotli / zstandard packages, without them they're skipped), none disables it
+COMPRESSION = getenv("COMPRESSION", "zstd,br,gzip")
+# smaller responses are sent as they are (streamed ones are always compressed)
+COMPRESSION_MIN_SIZE = int(getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_TYPES = getenv(
+    "COMPRESSION_TYPES", "application/json,application/x-ndjson,text/csv,text/plain"
+)
+COMPRESSION_GZIP_LEVEL = int(getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BR_QUALITY = int(getenv("COMPRESSION_BR_QUALITY", 4))
+COMPRESSION_ZSTD_LEVEL = int(getenv("COMPRESSION_ZSTD_LEVEL", 3))
+# jobs the endpoints leave for after the response (see jobs.py) are kept in
+# memory (per worker, lost on restart) or sqlite (an outbox table in a local file)
+JOB_QUEUE = getenv("JOB_QUEUE", "memory")
+JOB_QUEUE_PATH = getenv("JOB_QUEUE_PATH", path.join(gettempdir(), "dors-jobs.db"))
+# jobs run at the same time, per worker
+JOB_WORKERS = int(getenv("JOB_WORKERS", 2))
+# a failed job is retried after JOB_RETRY_DELAY * 2^(attempts - 1) seconds,
+# until it has failed JOB_MAX_ATTEMPTS times
+JOB_MAX_ATTEMPTS = int(getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_DELAY = float(getenv("JOB_RETRY_DELAY", 1))
+# a job running longer is cancelled (and retried)
+JOB_TIMEOUT = float(getenv("JOB_TIMEOUT", 60))
+# sqlite: how often the workers look for the jobs enqueued by the other workers
+JOB_POLL_INTERVAL = float(getenv("JOB_POLL_INTERVAL", 1))
+# logs (JSON lines on stderr, see helpers.py): the level, and the share of the
+# records below WARNING kept by logger (with its children), e.g.
+# "uvicorn.access=0.1,sqlalchemy.engine=0.01"
+LOG_LEVEL = getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLING = getenv("LOG_SAMPLING", "")
+# records waiting to be written, more are dropped (the requests never wait for them)
+LOG_QUEUE_SIZE = int(getenv("LOG_QUEUE_SIZE", 10000))
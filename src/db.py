@@ -1,13 +1,195 @@
+from collections import Counter
+from itertools import cycle
 from os import getenv
-from fastapi import HTTPException
-from sqlmodel import Session, SQLModel, create_engine
+from time import perf_counter, time
+
+from fastapi import HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import ArgumentError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import MutableHeaders
+
+from .constants import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_REPLICA_URLS,
+    DB_STICKY_SECONDS,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+)
+from .metrics import record_query
 
 DB_URL = getenv("DB_URL")
 
+# async drivers used for the sync DB_URL's dialect
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+# set on every new SQLite connection,
+# WAL lets readers run next to the (single) writer of the other workers
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+}
+
+# the client's reads go to the primary until then (Unix time), see EngineRouter
+STICKY_COOKIE = "db_primary_until"
+
+
+def get_async_url(url):
+    """
+    Returns the URL with the dialect's async driver, e.g.
+    sqlite:///database.db -> sqlite+aiosqlite:///database.db
+    """
+    url = make_url(url)
+    if url.get_dialect().is_async:
+        return url
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(perf_counter() - conn.info["query_started"].pop())
+
+
+def make_engine(url, create=create_engine):
+    """
+    Creates the (sync or async, see `create`) engine for the URL,
+    with the pool and, for SQLite, the connection settings from the env vars.
+    """
+    url = make_url(url)
+    # no echo, the SQL statements are logged with DEBUG (see helpers.setup_logging)
+    options = {"echo": False}
+
+    # in-memory SQLite uses a single, static, connection
+    if url.database and url.database != ":memory:":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=url.get_backend_name() != "sqlite",
+        )
+
+    new_engine = create(url, **options)
+    sync_engine = getattr(new_engine, "sync_engine", new_engine)
+    # count the statements (and their time) of the current request, see metrics.py
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    if url.get_backend_name() == "sqlite":
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    return new_engine
+
+
+class EngineRouter:
+    """
+    Sends the reads to the replicas (in turn) and the writes to the primary.
+
+    The replicas lag behind the primary, so for `sticky_seconds` after its own
+    write a client reads from the primary too (StickyPrimaryMiddleware gives it
+    a cookie), and its reads skip the response cache (see api.cached_response).
+    Only the records read from the primary are cached.
+    """
+
+    def __init__(self, primary, replicas=(), sticky_seconds=DB_STICKY_SECONDS):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.sticky_seconds = sticky_seconds
+        self._replicas = cycle(self.replicas)
+        self.stats = Counter({"primary_reads": 0, "replica_reads": 0, "sticky_reads": 0})
+
+    def write_engine(self, request):
+        # the middleware sets the cookie when the write succeeds
+        request.state.db_write = True
+        return self.primary
+
+    def read_engine(self, request):
+        if not self.replicas:
+            self.stats["primary_reads"] += 1
+            return self.primary
+
+        try:
+            sticky = float(request.cookies.get(STICKY_COOKIE, 0)) > time()
+        except ValueError:
+            sticky = False
+        if sticky:
+            request.state.read_your_writes = True
+            self.stats["sticky_reads"] += 1
+            return self.primary
+
+        # its responses aren't cached (see api.cache_response)
+        request.state.db_replica = True
+        self.stats["replica_reads"] += 1
+        return next(self._replicas)
+
+
+class StickyPrimaryMiddleware:
+    """
+    Gives the clients whose write succeeded the cookie sending their reads
+    to the primary for a while (see EngineRouter).
+    """
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        router = self.router or engines
+        if scope["type"] != "http" or not router.replicas:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and scope.get("state", {}).get("db_write")
+            ):
+                seconds = router.sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie",
+                    f"{STICKY_COOKIE}={time() + seconds:.0f}; Max-Age={seconds:.0f};"
+                    " Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def split_urls(value):
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
 try:
-    engine = create_engine(DB_URL, echo=True)
-except ArgumentError as err:
+    # The sync engine is kept for creating tables and scripts (alembic, populate_db)
+    engine = make_engine(DB_URL)
+    async_engine = make_engine(get_async_url(DB_URL), create_async_engine)
+    engines = EngineRouter(async_engine, [
+        make_engine(get_async_url(url), create_async_engine)
+        for url in split_urls(DB_REPLICA_URLS)
+    ])
+except (ArgumentError, KeyError) as err:
     raise HTTPException(
         status_code=500,
         detail=f"create_engine(DB_URL): {err}" if err else "DB_URL env var is not set(?)",
@@ -18,6 +200,30 @@ def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 
-def get_session():
-    with Session(engine) as session:
+def pool_stats():
+    """
+    Returns the state of the async engine's connection pool.
+    """
+    pool = async_engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+async def get_session(request: Request):
+    # objects are returned to the client after commit,
+    # so don't expire them (it would need another, lazy, DB round trip)
+    async with AsyncSession(
+        engines.write_engine(request), expire_on_commit=False
+    ) as session:
+        yield session
+
+
+async def get_read_session(request: Request):
+    # a replica's, unless the client has just written (see EngineRouter)
+    async with AsyncSession(
+        engines.read_engine(request), expire_on_commit=False
+    ) as session:
         yield session
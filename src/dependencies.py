@@ -4,26 +4,48 @@ import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
-from sqlmodel import Session, select
-
-from .constants import ALGORITHM, SECRET_KEY
-from .db import engine
-from .helpers import logger
-from .models import (
-    Reporter,
-    ReporterBase,
-    TokenData,
-    # User,
-    # UserBase,
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .cache import TTLCache, make_bytes_cache
+from .constants import (
+    ALGORITHM,
+    RESPONSE_CACHE,
+    RESPONSE_CACHE_BYTES,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL,
+    SECRET_KEY,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    WEB_CONCURRENCY,
 )
+from .db import async_engine
+from .helpers import logger
+from .models import Reporter, ReporterBase, TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Reporters resolved from the tokens, by username.
+# Entries have to be invalidated when a reporter is updated.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# Serialised single record responses, by "<table>:<id>".
+# Entries are invalidated by the writes (see api.invalidate_cached).
+response_cache = make_bytes_cache(
+    RESPONSE_CACHE, RESPONSE_CACHE_BYTES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_PATH
+)
+if RESPONSE_CACHE == "memory" and WEB_CONCURRENCY > 1:
+    logger.warning(
+        "RESPONSE_CACHE=memory with %d workers, they serve the responses changed"
+        " in another worker for up to %s s",
+        WEB_CONCURRENCY,
+        RESPONSE_CACHE_TTL,
+    )
 
-def get_user(username: str):
-    with Session(engine) as session:
+
+async def get_user(username: str):
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         statement = select(Reporter).where(Reporter.username == username)
-        user = session.exec(statement).first()
+        user = (await session.exec(statement)).first()
 
         if not user:
             logger.error("Incorrect credentials")
@@ -55,12 +77,19 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     except InvalidTokenError:
         raise credentials_exception from None
 
-    user = get_user(username=token_data.username)
+    user = user_cache.get(token_data.username)
 
     if user is None:
-        raise credentials_exception
+        user = await get_user(username=token_data.username)
+
+        if user is None:
+            raise credentials_exception
+
+        # detached copy, it's shared by all the requests of this user (read only)
+        user = Reporter(**user.model_dump())
+        user_cache.set(token_data.username, user)
 
-    return Reporter(**user.dict())
+    return user
 
 
 async def get_current_active_user(
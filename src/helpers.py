@@ -1,4 +1,225 @@
+"""
+Logging: every record is a JSON line (JSONFormatter) on stderr.
+
+The handlers of the loggers only put the records into a queue, a thread (the
+QueueListener) formats and writes them, so the event loop never waits for the
+I/O. When the thread can't keep up (LOG_QUEUE_SIZE records waiting) the records
+are dropped, not the requests slowed down.
+
+The records of the loggers in LOG_SAMPLING below WARNING are sampled, and every
+record has the ID of the request it was logged in (see RequestIdMiddleware).
+
+Also the connections to the local SQLite files the workers share (connect_local_sqlite).
+"""
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
+import re
+import sqlite3
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .constants import DEBUG, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLING
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# a client's request ID is used only when it looks like one (it ends up in the logs)
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+# the attributes every record has, the others are its `extra` fields
+# (but uvicorn's message with the terminal colours)
+RECORD_ATTRIBUTES = {
+    *vars(logging.makeLogRecord({})), "message", "request_id", "color_message"
+}
+
+# set on the connections of connect_local_sqlite, WAL lets the workers read
+# while another one writes
+LOCAL_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 1000,
+}
+
+# ID of the request being handled, see RequestIdMiddleware
+request_id = ContextVar("request_id", default=None)
+# records written, sampled out and dropped (the queue was full), for /metrics
+log_stats = Counter({"queued": 0, "sampled_out": 0, "dropped": 0})
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    A JSON object per record: time (UTC), level, logger, message, request_id,
+    the `extra` fields and the exception (traceback).
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(
+            (name, value)
+            for name, value in vars(record).items()
+            if name not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps the `rates` share of the records below WARNING, by the logger
+    (the rate of its closest configured parent, 1 without any).
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        # by logger name
+        self._rate = {}
+
+    def rate(self, name):
+        if name not in self._rate:
+            parts = name.split(".")
+            names = (".".join(parts[:end]) for end in range(len(parts), 0, -1))
+            self._rate[name] = next(
+                (self.rates[parent] for parent in names if parent in self.rates), 1
+            )
+        return self._rate[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        log_stats["sampled_out"] += 1
+        return False
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Puts the records into the queue of the QueueListener's thread, with the
+    message and the traceback already formatted (their arguments may change in
+    the meantime) and the request ID. Never blocks, drops them when it's full.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats["dropped"] += 1
+        else:
+            log_stats["queued"] += 1
+
+
+def parse_rates(value):
+    """
+    The sampling rates of "logger=rate,..." (e.g. "uvicorn.access=0.1").
+    """
+    rates = {}
+    for item in value.split(","):
+        if item.strip():
+            name, _, rate = item.partition("=")
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(level=LOG_LEVEL, sampling=LOG_SAMPLING, queue_size=LOG_QUEUE_SIZE):
+    """
+    Sends the records of every logger through the queue to the JSON stderr
+    handler. Returns the (started) listener.
+    """
+    records = queue.Queue(queue_size)
+    stream = logging.StreamHandler()
+    stream.setFormatter(JSONFormatter())
+    listener = QueueListener(records, stream)
+
+    handler = BackgroundHandler(records)
+    handler.addFilter(SamplingFilter(parse_rates(sampling)))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    # uvicorn's loggers write on their own (in the event loop), send them here too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+    # the SQL statements, instead of the engines' echo
+    if DEBUG:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    listener.start()
+    # writes the records still in the queue
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestIdMiddleware:
+    """
+    Sets the request ID (the client's X-Request-ID, or a new one) the records
+    logged while handling the request have, and returns it in X-Request-ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        given = Headers(scope=scope).get(REQUEST_ID_HEADER, "")
+        current = given if VALID_REQUEST_ID.fullmatch(given) else uuid4().hex
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = current
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+def connect_local_sqlite(path):
+    """
+    Connection to a SQLite file shared by the workers of the host (e.g. the
+    response cache, the job queue), usable from any thread.
+    """
+    # autocommit, every statement is its own (short) transaction
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    for name, value in LOCAL_SQLITE_PRAGMAS.items():
+        db.execute(f"PRAGMA {name}={value}")
+    return db
+
 
-logging.basicConfig(level=logging.INFO)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
@@ -0,0 +1,315 @@
+"""
+In-process job queue, for what the endpoints don't have to do before they respond.
+
+The endpoints enqueue jobs (a registered handler's name and its keyword arguments,
+JSON serialisable), JOB_WORKERS asyncio tasks of the worker run them. The jobs are
+kept by a store: memory (lost when the worker stops) or sqlite (an outbox table in
+JOB_QUEUE_PATH, shared by the workers of the host, a job stays there until it's
+done, so the jobs of a crashed worker are run by another one).
+
+A failed job is retried after JOB_RETRY_DELAY * 2^(attempts - 1) seconds, after
+JOB_MAX_ATTEMPTS attempts it's given up (and kept in the outbox, marked failed).
+
+The stores' methods are coroutines, the sqlite one runs its queries in a thread,
+so the event loop never waits while another worker has the outbox locked.
+"""
+import asyncio
+import heapq
+import json
+import threading
+from collections import Counter
+from itertools import count
+from time import time
+from typing import NamedTuple
+
+from .constants import (
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_QUEUE,
+    JOB_QUEUE_PATH,
+    JOB_RETRY_DELAY,
+    JOB_TIMEOUT,
+    JOB_WORKERS,
+)
+from .helpers import connect_local_sqlite, logger
+
+logger = logger.getChild(__name__)
+
+
+class Job(NamedTuple):
+    id: int
+    name: str
+    payload: dict
+    attempts: int
+
+
+class MemoryJobStore:
+    """
+    Jobs of this process, by the time they are due.
+    """
+
+    # the other processes don't add any jobs, no need to look for them
+    shared = False
+
+    def __init__(self):
+        self._due = []
+        self._ids = count(1)
+        self._failed = 0
+
+    async def put(self, name, payload, run_at):
+        job = Job(next(self._ids), name, payload, 0)
+        heapq.heappush(self._due, (run_at, job.id, job))
+
+    async def take(self, now, lock_seconds):
+        if self._due and self._due[0][0] <= now:
+            return heapq.heappop(self._due)[2]
+        return None
+
+    async def next_run_at(self):
+        return self._due[0][0] if self._due else None
+
+    async def done(self, job):
+        pass
+
+    async def retry(self, job, attempts, run_at, error):
+        job = job._replace(attempts=attempts)
+        heapq.heappush(self._due, (run_at, job.id, job))
+
+    async def fail(self, job, attempts, error):
+        self._failed += 1
+
+    async def failed(self):
+        return self._failed
+
+    async def depth(self):
+        return len(self._due)
+
+
+class SQLiteJobStore:
+    """
+    Outbox table in a SQLite file, shared by all the workers (processes) of the host.
+
+    A worker takes a job by locking it for `lock_seconds` (longer than a job may
+    run), when it doesn't finish it by then (it has crashed), another one takes it.
+    The queries run in a thread (one at a time per instance).
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = connect_local_sqlite(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, run_at REAL NOT NULL, "
+            "locked_until REAL NOT NULL DEFAULT 0, "
+            "failed INTEGER NOT NULL DEFAULT 0, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_outbox_failed_run_at"
+            " ON outbox (failed, run_at)"
+        )
+
+    def _execute(self, statement, parameters=()):
+        with self._lock:
+            return self._db.execute(statement, parameters).fetchone()
+
+    async def _query(self, statement, parameters=()):
+        return await asyncio.to_thread(self._execute, statement, parameters)
+
+    async def put(self, name, payload, run_at):
+        await self._query(
+            "INSERT INTO outbox (name, payload, run_at) VALUES (?, ?, ?)",
+            (name, json.dumps(payload), run_at),
+        )
+
+    async def take(self, now, lock_seconds):
+        row = await self._query(
+            "UPDATE outbox SET locked_until = ? WHERE id = ("
+            "SELECT id FROM outbox WHERE failed = 0 AND run_at <= ? AND locked_until <= ?"
+            " ORDER BY run_at LIMIT 1) RETURNING id, name, payload, attempts",
+            (now + lock_seconds, now, now),
+        )
+        if row is None:
+            return None
+        id, name, payload, attempts = row
+        return Job(id, name, json.loads(payload), attempts)
+
+    async def next_run_at(self):
+        (run_at,) = await self._query(
+            "SELECT min(max(run_at, locked_until)) FROM outbox WHERE failed = 0"
+        )
+        return run_at
+
+    async def done(self, job):
+        await self._query("DELETE FROM outbox WHERE id = ?", (job.id,))
+
+    async def retry(self, job, attempts, run_at, error):
+        await self._query(
+            "UPDATE outbox SET attempts = ?, run_at = ?, locked_until = 0, error = ?"
+            " WHERE id = ?",
+            (attempts, run_at, error, job.id),
+        )
+
+    async def fail(self, job, attempts, error):
+        await self._query(
+            "UPDATE outbox SET attempts = ?, failed = 1, error = ? WHERE id = ?",
+            (attempts, error, job.id),
+        )
+
+    async def count(self, failed):
+        statement = "SELECT count(*) FROM outbox WHERE failed = ?"
+        return (await self._query(statement, (int(failed),)))[0]
+
+    async def failed(self):
+        return await self.count(failed=True)
+
+    async def depth(self):
+        return await self.count(failed=False)
+
+
+def make_job_store(backend: str, path: str = ""):
+    """
+    The job store for the `backend` name: memory or sqlite.
+    """
+    if backend == "sqlite":
+        return SQLiteJobStore(path)
+    if backend == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+
+class JobQueue:
+    """
+    Runs the enqueued jobs with their handlers (see `handler`), in `workers` tasks.
+    The workers are started (and stopped) with the app, see main.lifespan.
+    """
+
+    def __init__(
+        self,
+        store,
+        workers=JOB_WORKERS,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        retry_delay=JOB_RETRY_DELAY,
+        timeout=JOB_TIMEOUT,
+        poll_interval=JOB_POLL_INTERVAL,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.counts = Counter({"enqueued": 0, "done": 0, "retried": 0})
+        self.running = 0
+        self._tasks = []
+        self._wakeup = None
+        self._stopping = False
+
+    def handler(self, name):
+        """
+        Registers the decorated coroutine function as the handler of the `name` jobs.
+        """
+        def register(function):
+            self.handlers[name] = function
+            return function
+        return register
+
+    async def enqueue(self, name, **payload):
+        await self.store.put(name, payload, time())
+        self.counts["enqueued"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Stops the workers, the running jobs get `timeout` seconds to finish.
+        The jobs kept in memory that are due are run before it returns.
+        """
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks:
+            _, running = await asyncio.wait(self._tasks, timeout=self.timeout)
+            for task in running:
+                task.cancel()
+        self._tasks = []
+        self._wakeup = None
+
+        if self.store.shared:
+            return
+        await self.run_pending()
+        left = await self.store.depth()
+        if left:
+            logger.warning("%d jobs left in the queue are lost", left)
+
+    async def run_pending(self):
+        """
+        Runs the jobs that are due, here and now (without the workers).
+        """
+        while (job := await self.store.take(time(), self.timeout * 2)) is not None:
+            await self.run(job)
+
+    async def run(self, job):
+        self.running += 1
+        try:
+            handler = self.handlers.get(job.name)
+            if handler is None:
+                raise LookupError(f"No handler for the {job.name} jobs")
+            await asyncio.wait_for(handler(**job.payload), self.timeout)
+        except Exception as err:
+            attempts = job.attempts + 1
+            error = f"{type(err).__name__}: {err}"
+            if attempts >= self.max_attempts:
+                await self.store.fail(job, attempts, error)
+                logger.error("Job %s %s given up: %s", job.name, job.payload, error)
+            else:
+                run_at = time() + self.retry_delay * 2 ** (attempts - 1)
+                await self.store.retry(job, attempts, run_at, error)
+                self.counts["retried"] += 1
+        else:
+            await self.store.done(job)
+            self.counts["done"] += 1
+        finally:
+            self.running -= 1
+
+    async def _work(self):
+        while not self._stopping:
+            # cleared before looking, so a job enqueued in the meantime wakes it up
+            self._wakeup.clear()
+            job = await self.store.take(time(), self.timeout * 2)
+            if job is not None:
+                await self.run(job)
+                continue
+
+            next_run_at = await self.store.next_run_at()
+            timeout = None if next_run_at is None else max(0, next_run_at - time())
+            if self.store.shared:
+                # the other workers' jobs don't wake it up
+                timeout = min(
+                    self.poll_interval if timeout is None else timeout,
+                    self.poll_interval,
+                )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stats(self):
+        return {
+            **self.counts,
+            "depth": await self.store.depth(),
+            "running": self.running,
+            "failed": await self.store.failed(),
+            "workers": len(self._tasks),
+        }
+
+
+job_queue = JobQueue(make_job_store(JOB_QUEUE, JOB_QUEUE_PATH))
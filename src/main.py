@@ -1,10 +1,16 @@
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from .helpers import logger
+from .compression import CompressionMiddleware
+from .db import StickyPrimaryMiddleware
+from .helpers import RequestIdMiddleware, logger
+from .jobs import job_queue
+from .metrics import MetricsMiddleware
 from .routers import api, auth, default
 
 logger = logger.getChild(__name__)
@@ -38,7 +44,17 @@ tags_metadata = [
     {"name": "reports"},
 ]
 
+
+@asynccontextmanager
+async def lifespan(app):
+    # the workers running what the endpoints leave for after the response
+    job_queue.start()
+    yield
+    await job_queue.stop()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     redirect_slashes=True,
     openapi_tags=tags_metadata,
     title="Disease Outbreak Reporting System API",
@@ -57,6 +73,10 @@ app.include_router(api.router)
 app.include_router(auth.router)
 app.include_router(default.router)
 
+# the innermost middleware, it compresses what the app returns
+app.add_middleware(CompressionMiddleware)
+# after a write, the client's reads go to the primary DB (see db.EngineRouter)
+app.add_middleware(StickyPrimaryMiddleware)
 app.add_middleware(
     CORSMiddleware,
     # TODO: Fix this security issue
@@ -65,6 +85,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# so the timing covers the whole request
+app.add_middleware(MetricsMiddleware)
+# the outermost middleware, everything logged for the request has its ID
+app.add_middleware(RequestIdMiddleware)
 
 @app.exception_handler(HTTPException)
 async def generic_api_exception_handler(request: Request, ex: HTTPException):
@@ -0,0 +1,167 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+# uncompressed / compressed size
+RATIO_BUCKETS = (1, 1.5, 2, 3, 4, 6, 8, 12, 16, 32)
+# seconds (of CPU time)
+CPU_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class Histogram:
+    """
+    Prometheus style histogram (cumulative buckets, sum and count) per label set.
+
+    Like the other caches/stats here it's per process,
+    so every uvicorn worker exposes its own numbers.
+    """
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [count per bucket (+Inf last), sum]
+        self._data = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0])
+
+    def observe(self, value, *label_values):
+        entry = self._data[label_values]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._data.items()):
+            labels = [
+                f'{name}="{value}"'
+                for name, value in zip(self.labels, label_values, strict=True)
+            ]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                bucket_labels = ",".join([*labels, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return "\n".join(lines)
+
+
+def render_gauges(name, help, values):
+    """
+    Renders a dict of numbers as gauges, labelled by their keys.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        if isinstance(value, (int, float)):
+            lines.append(f'{name}{{name="{key}"}} {value}')
+    return "\n".join(lines)
+
+
+REQUEST_LABELS = ("method", "route", "status")
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling the request.",
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+)
+request_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request.",
+    QUERY_BUCKETS,
+    REQUEST_LABELS,
+)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL statements per request.",
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+)
+COMPRESSION_LABELS = ("encoding", "route")
+compression_ratio = Histogram(
+    "http_response_compression_ratio",
+    "Uncompressed to compressed size of the compressed responses.",
+    RATIO_BUCKETS,
+    COMPRESSION_LABELS,
+)
+compression_cpu = Histogram(
+    "http_response_compression_cpu_seconds",
+    "CPU time spent compressing the response.",
+    CPU_BUCKETS,
+    COMPRESSION_LABELS,
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# the stats of the request being handled (if any),
+# the DB engine's event hooks add the statements to it
+current_request = ContextVar("current_request", default=None)
+
+
+def record_query(seconds):
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+class MetricsMiddleware:
+    """
+    Records latency, number of SQL statements and DB time of every HTTP request,
+    and returns them in the `Server-Timing` header.
+
+    The histograms are labelled by the route's path (e.g. /api/reports/{id}),
+    not the requested URL, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (perf_counter() - started) * 1000
+                timing = (
+                    f"app;dur={elapsed:.1f}, "
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", timing.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            labels = (
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
+            request_duration.observe(perf_counter() - started, *labels)
+            request_queries.observe(stats.queries, *labels)
+            request_db_duration.observe(stats.db_seconds, *labels)
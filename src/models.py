@@ -4,14 +4,16 @@ from typing import Annotated, Union
 
 from pydantic import EmailStr, computed_field, validator
 from pydantic_extra_types.phone_numbers import PhoneNumber, PhoneNumberValidator
-from sqlalchemy import INTEGER, cast
+from sqlalchemy import DDL, INTEGER, DateTime, cast, event
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import column_property, declared_attr
+from sqlalchemy.sql.functions import FunctionElement
 from sqlmodel import (
     Column,
     Enum,
     FetchedValue,
     Field,
-    ForeignKey,
+    Index,
     Relationship,
     SQLModel,
     TIMESTAMP,
@@ -57,6 +59,20 @@ class ReportStatus(PyEnum):
     approved = "Approved"
 
 
+class Versioned(SQLModel):
+    """
+    Optimistic concurrency: every UPDATE checks and increments `version`,
+    an UPDATE of a row changed in the meantime raises StaleDataError.
+    """
+    version: int = Field(
+        default=1, nullable=False, sa_column_kwargs={"server_default": text("1")}
+    )
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
+
+
 class Token(SQLModel):
     access_token: str
     token_type: str
@@ -93,7 +109,7 @@ class ReporterBase(SQLModel):
     organization_address: str = Field(nullable=False, max_length=500)
 
 
-class Reporter(ReporterBase, table=True):
+class Reporter(Versioned, ReporterBase, table=True):
     __table_args__ = {'extend_existing': True}
 
     id: int = Field(primary_key=True)
@@ -107,8 +123,9 @@ class Reporter(ReporterBase, table=True):
     )
     reports: list["Report"] = Relationship(
         back_populates="reporter",
-        sa_relationship=ForeignKey("report.id"),
         cascade_delete=True,
+        # Report references the reporter twice (reporter_id and updated_by)
+        sa_relationship_kwargs={"foreign_keys": "Report.reporter_id"},
     )
 
 
@@ -122,7 +139,7 @@ class PatientBase(SQLModel):
     emergency_contact: str = Field(nullable=True, max_length=200)
 
 
-class Patient(PatientBase, table=True):
+class Patient(Versioned, PatientBase, table=True):
     __table_args__ = {'extend_existing': True}
 
     id: int | None = Field(primary_key=True)
@@ -151,8 +168,13 @@ class DiseaseBase(SQLModel):
     treatment_status: TreatmentStatus = Field(Enum(TreatmentStatus), nullable=False)
 
 
-class Disease(DiseaseBase, table=True):
-    __table_args__ = {'extend_existing': True}
+class Disease(Versioned, DiseaseBase, table=True):
+    __table_args__ = (
+        # the report listing's filters
+        Index("ix_disease_category_severity_level", "category", "severity_level"),
+        Index("ix_disease_severity_level", "severity_level"),
+        {'extend_existing': True},
+    )
 
     id: int = Field(primary_key=True)
 
@@ -177,6 +199,52 @@ class Disease(DiseaseBase, table=True):
     )
 
 
+# Full-text index of the diseases' symptoms and lab results (SQLite FTS5, see
+# search.py). It only stores the index, the text is read from the disease table,
+# and the triggers keep it in sync with every write (ORM, bulk inserts, SQL).
+DISEASE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS disease_fts USING fts5(
+        symptoms, lab_results,
+        content='disease', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS disease_fts_insert AFTER INSERT ON disease BEGIN
+        INSERT INTO disease_fts (rowid, symptoms, lab_results)
+        VALUES (new.id, new.symptoms, new.lab_results);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS disease_fts_delete AFTER DELETE ON disease BEGIN
+        INSERT INTO disease_fts (disease_fts, rowid, symptoms, lab_results)
+        VALUES ('delete', old.id, old.symptoms, old.lab_results);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS disease_fts_update
+    AFTER UPDATE OF symptoms, lab_results ON disease BEGIN
+        INSERT INTO disease_fts (disease_fts, rowid, symptoms, lab_results)
+        VALUES ('delete', old.id, old.symptoms, old.lab_results);
+        INSERT INTO disease_fts (rowid, symptoms, lab_results)
+        VALUES (new.id, new.symptoms, new.lab_results);
+    END
+    """,
+)
+
+# create_all()/drop_all() (alembic creates it in a migration)
+for statement in DISEASE_FTS_DDL:
+    event.listen(
+        Disease.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Disease.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS disease_fts").execute_if(dialect="sqlite"),
+)
+
+
 class ReportBase(SQLModel):
     status: ReportStatus = Field(Enum(ReportStatus, nullable=False))
 
@@ -184,17 +252,58 @@ class ReportBase(SQLModel):
     disease_id: int | None = Field(default=None, nullable=True)
 
 
-class Report(ReportBase, table=True):
-    __table_args__ = {'extend_existing': True}
+class current_timestamp_us(FunctionElement):
+    """
+    CURRENT_TIMESTAMP, with microseconds on SQLite (as SQLAlchemy stores the
+    datetimes), so the values of the server default compare with the others.
+    """
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(current_timestamp_us)
+def compile_current_timestamp_us(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(current_timestamp_us, "sqlite")
+def compile_sqlite_current_timestamp_us(element, compiler, **kw):
+    # %f has milliseconds only
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+class Report(Versioned, ReportBase, table=True):
+    __table_args__ = (
+        # keyset pagination, (date_updated, id) is the cursor
+        Index("ix_report_date_updated_id", "date_updated", "id"),
+        # the most recent reports with the given status
+        Index("ix_report_status_date_updated_id", "status", "date_updated", "id"),
+        # reports of a disease, its changes are applied to the rollup
+        # (and the most recent reports of diseases, for the listing's filters)
+        Index("ix_report_disease_id_date_updated", "disease_id", "date_updated"),
+        # reports of a patient/reporter, their cached responses include them
+        Index("ix_report_patient_id", "patient_id"),
+        # (and a reporter's most recent reports, for the listing's filter)
+        Index(
+            "ix_report_reporter_id_date_updated_id", "reporter_id", "date_updated", "id"
+        ),
+        # the listing's date range filter
+        Index("ix_report_date_created", "date_created"),
+        {'extend_existing': True},
+    )
 
     id: int | None = Field(default=None, primary_key=True)
 
+    # the timestamps always have microseconds (CURRENT_TIMESTAMP has none),
+    # so they compare correctly with the ones bound in the cursors
     date_created: datetime = Field(
         default=None,
         sa_column=Column(
             TIMESTAMP(timezone=True),
             nullable=False,
-            server_default=text("CURRENT_TIMESTAMP"),
+            default=datetime.now,
+            server_default=current_timestamp_us(),
         )
     )
     date_updated: datetime | None = Field(
@@ -202,7 +311,8 @@ class Report(ReportBase, table=True):
         sa_column=Column(
             TIMESTAMP(timezone=True),
             nullable=False,
-            server_default=text("CURRENT_TIMESTAMP"),
+            default=datetime.now,
+            server_default=current_timestamp_us(),
             server_onupdate=FetchedValue(),
         )
     )
@@ -212,18 +322,95 @@ class Report(ReportBase, table=True):
     reporter_id: int | None = Field(default=None, foreign_key="reporter.id")
 
     reporter: Reporter | None = Relationship(
-        back_populates="report",
-        sa_relationship=ForeignKey("reporter.id"),
+        back_populates="reports",
+        sa_relationship_kwargs={"foreign_keys": "Report.reporter_id"},
     )
+    patient: Patient | None = Relationship()
+    disease: Disease | None = Relationship()
+
+
+class ReportRollup(SQLModel, table=True):
+    """
+    Number of reports per day (the disease was detected), disease category,
+    severity and report status. Kept up to date by the endpoints (see rollup.py).
+    Enums are stored by name, "" when the report has no disease.
+    """
+    __tablename__ = "report_rollup"
+
+    day: str = Field(primary_key=True, max_length=10)
+    category: str = Field(primary_key=True, max_length=9)
+    severity_level: str = Field(primary_key=True, max_length=8)
+    status: str = Field(primary_key=True, max_length=12)
+    count: int = Field(default=0, nullable=False)
 
 
 class ReportResponse(ReportBase):
     id: int
+    version: int
     date_created: datetime
     date_updated: datetime
-    reporter_id: int
-    patient_id: int
+    # the relations are nullable, a draft may not have them yet
+    reporter_id: int | None
+    patient_id: int | None
+    disease_id: int | None
+    reporter: Reporter | None
+    patient: Patient | None
+    disease: Disease | None
+
+
+class ReportPage(SQLModel):
+    items: list[ReportResponse]
+    # pass it as `cursor` to get the next page, it's null on the last page
+    next_cursor: str | None
+
+
+class SearchHit(SQLModel):
     disease_id: int
-    reporter: Reporter
-    patient: Patient
-    disease: Disease
+    name: str
+    category: DiseaseCategory
+    severity_level: SeverityLevel
+    date_detected: datetime
+    # reports of the disease
+    report_ids: list[int]
+    # the matching fragments, the terms in <mark></mark> (the text isn't HTML escaped)
+    symptoms: str
+    lab_results: str | None
+    # bm25, lower is better
+    rank: float
+
+
+class SearchPage(SQLModel):
+    items: list[SearchHit]
+    # pass it as `offset` to get the next page, it's null on the last page
+    next_offset: int | None
+
+
+class ReportBundle(SQLModel):
+    """
+    Report with its (new) patient and disease, for bulk uploads.
+    """
+    report: ReportBase
+    patient: PatientBase | None = None
+    disease: DiseaseBase | None = None
+
+
+class BulkItemResult(SQLModel):
+    # position of the item in the uploaded array / NDJSON lines
+    index: int
+    status_code: int
+    report_id: int | None = None
+    patient_id: int | None = None
+    disease_id: int | None = None
+    detail: str | list | None = None
+
+
+class ReportStats(SQLModel):
+    """
+    Report counts, every list has [value, count] pairs.
+    """
+    total: int
+    by_category: list[tuple[DiseaseCategory | None, int]]
+    by_severity: list[tuple[SeverityLevel | None, int]]
+    by_status: list[tuple[ReportStatus, int]]
+    # the first day (YYYY-MM-DD) of the day/week the disease was detected
+    by_period: list[tuple[str | None, int]]
@@ -0,0 +1,116 @@
+"""
+Sparse fieldsets of the report responses: `fields=status,disease.name` selects
+only those columns (and joins only the relations they're from) instead of whole
+reports with their reporter, patient and disease.
+"""
+from sqlalchemy import inspect
+from sqlmodel import select
+
+from .models import Disease, Patient, Report, ReportResponse, Reporter
+
+# the relations of the reports, with their foreign keys
+RELATIONS = {
+    "reporter": (Reporter, Report.reporter_id),
+    "patient": (Patient, Report.patient_id),
+    "disease": (Disease, Report.disease_id),
+}
+# never returned in a projection
+HIDDEN_COLUMNS = {"hashed_password"}
+
+
+def selectable_columns(model, names=None):
+    """
+    The model's columns (and column properties, e.g. the patient's age) by name.
+    """
+    return {
+        attr.key: getattr(model, attr.key)
+        for attr in inspect(model).column_attrs
+        if attr.key not in HIDDEN_COLUMNS and (names is None or attr.key in names)
+    }
+
+
+REPORT_COLUMNS = selectable_columns(Report, ReportResponse.model_fields)
+RELATION_COLUMNS = {
+    relation: selectable_columns(model) for relation, (model, _) in RELATIONS.items()
+}
+
+
+def split(names):
+    return [name.strip() for name in (names or "").split(",") if name.strip()]
+
+
+class Projection:
+    """
+    The columns of the report (`report`) and of its relations (`relations`,
+    relation -> columns) to return, the IDs are always included.
+    """
+
+    def __init__(self, report, relations):
+        self.report = report
+        self.relations = relations
+
+    @classmethod
+    def parse(cls, fields, include):
+        """
+        `fields`: the report's columns (e.g. status) and its relations' columns
+        (e.g. disease.name), all the report's columns when it's not given.
+        `include`: relations to return with all their columns.
+        Raises ValueError for unknown names.
+        """
+        report = dict.fromkeys(["id"]) if fields is not None else dict(REPORT_COLUMNS)
+        relations = {}
+        unknown = []
+
+        for relation in split(include):
+            if relation in RELATIONS:
+                relations[relation] = dict(RELATION_COLUMNS[relation])
+            else:
+                unknown.append(relation)
+
+        for name in split(fields):
+            relation, _, column = name.partition(".")
+            if not column and name in REPORT_COLUMNS:
+                report[name] = None
+            elif column in RELATION_COLUMNS.get(relation, ()):
+                relations.setdefault(relation, dict.fromkeys(["id"]))[column] = None
+            else:
+                unknown.append(name)
+
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        relations = {relation: list(names) for relation, names in relations.items()}
+        return cls(list(report), relations)
+
+    def select(self):
+        """
+        SELECT of the columns, the relations outer joined (a draft may not have
+        them yet). The report's date_updated is always there, for the cursors.
+        """
+        columns = [
+            REPORT_COLUMNS[name].label(name)
+            for name in dict.fromkeys([*self.report, "date_updated"])
+        ]
+        for relation, names in self.relations.items():
+            columns += [
+                RELATION_COLUMNS[relation][name].label(f"{relation}.{name}")
+                for name in names
+            ]
+
+        statement = select(*columns).select_from(Report)
+        for relation in self.relations:
+            model, foreign_key = RELATIONS[relation]
+            statement = statement.outerjoin(model, model.id == foreign_key)
+        return statement
+
+    def payload(self, row):
+        """
+        The response's dict of a row of select(), a missing relation is None.
+        """
+        values = row._mapping
+        payload = {name: values[name] for name in self.report}
+        for relation, names in self.relations.items():
+            if values[f"{relation}.id"] is None:
+                payload[relation] = None
+            else:
+                payload[relation] = {name: values[f"{relation}.{name}"] for name in names}
+        return payload
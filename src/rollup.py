@@ -0,0 +1,178 @@
+"""
+Report counts per day × disease category × severity × report status
+(the `report_rollup` table), so the stats don't have to scan all the reports.
+
+The endpoints changing reports (or their diseases) count the affected reports
+before and after the change and apply the difference in the same transaction.
+If the table ever gets out of sync (or after loading data directly), rebuild it:
+
+    python -m src.rollup rebuild
+"""
+import argparse
+import asyncio
+from collections import Counter
+
+from sqlalchemy import DateTime, String, cast, delete, func, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .db import async_engine
+from .models import (
+    Disease,
+    DiseaseCategory,
+    Report,
+    ReportRollup,
+    ReportStats,
+    ReportStatus,
+    SeverityLevel,
+)
+
+ROLLUP_FIELDS = ("day", "category", "severity_level", "status")
+ROLLUP_KEYS = (
+    ReportRollup.day,
+    ReportRollup.category,
+    ReportRollup.severity_level,
+    ReportRollup.status,
+)
+
+# upserts (INSERT ... ON CONFLICT DO UPDATE) per dialect
+DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def period_bucket(column, period, dialect):
+    """
+    SQL expression truncating the date to the first day of its day/week (Monday),
+    as YYYY-MM-DD.
+    """
+    if dialect == "sqlite":
+        if period == "week":
+            # the next Sunday (or the same day) minus 6 days
+            return func.date(column, "weekday 0", "-6 days")
+        return func.date(column)
+    return func.to_char(func.date_trunc(period, cast(column, DateTime)), "YYYY-MM-DD")
+
+
+def select_report_keys(dialect):
+    """
+    Reports counted by their rollup key (the enums by their stored names).
+    """
+    keys = (
+        func.coalesce(period_bucket(Disease.date_detected, "day", dialect), ""),
+        func.coalesce(cast(Disease.category, String), ""),
+        func.coalesce(cast(Disease.severity_level, String), ""),
+        cast(Report.status, String),
+    )
+    return (
+        select(*keys, func.count(Report.id))
+        .select_from(Report)
+        .outerjoin(Disease, Disease.id == Report.disease_id)
+        .group_by(*keys)
+    )
+
+
+async def count_reports(session, where):
+    statement = select_report_keys(session.bind.dialect.name).where(where)
+    return Counter({tuple(key): count for *key, count in await session.exec(statement)})
+
+
+async def apply_delta(session, before, after):
+    rows = [
+        {**dict(zip(ROLLUP_FIELDS, key, strict=True)), "count": delta}
+        for key in before.keys() | after.keys()
+        if (delta := after[key] - before[key])
+    ]
+    if not rows:
+        return
+
+    statement = DIALECT_INSERTS[session.bind.dialect.name](ReportRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=ROLLUP_KEYS,
+        set_={"count": ReportRollup.count + statement.excluded.count},
+    )
+    await session.exec(statement, params=rows)
+
+    if any(row["count"] < 0 for row in rows):
+        await session.exec(delete(ReportRollup).where(ReportRollup.count <= 0))
+
+
+class RollupChange:
+    """
+    Reports (selected by `where`, a function returning the WHERE clause) about to
+    change. `apply()` flushes the changes and updates the rollup, without commit.
+    """
+
+    def __init__(self, where, before=None):
+        self.where = where
+        self.before = before or Counter()
+
+    @classmethod
+    async def start(cls, session, where):
+        return cls(where, await count_reports(session, where()))
+
+    async def apply(self, session):
+        await session.flush()
+        after = await count_reports(session, self.where())
+        await apply_delta(session, self.before, after)
+
+
+async def rollup_stats(session, period="day", report_status=None) -> ReportStats:
+    dialect = session.bind.dialect.name
+    filters = []
+    if report_status is not None:
+        filters.append(ReportRollup.status == report_status.name)
+
+    async def count_by(column):
+        statement = (
+            select(column, func.sum(ReportRollup.count))
+            .where(*filters)
+            .group_by(column)
+            .order_by(column)
+        )
+        return [tuple(row) for row in await session.exec(statement)]
+
+    def by_name(enum, counts):
+        return [(enum[name] if name else None, count) for name, count in counts]
+
+    by_status = by_name(ReportStatus, await count_by(ReportRollup.status))
+    return ReportStats(
+        total=sum(count for _, count in by_status),
+        by_category=by_name(DiseaseCategory, await count_by(ReportRollup.category)),
+        by_severity=by_name(SeverityLevel, await count_by(ReportRollup.severity_level)),
+        by_status=by_status,
+        by_period=await count_by(
+            period_bucket(func.nullif(ReportRollup.day, ""), period, dialect)
+        ),
+    )
+
+
+async def rebuild(session):
+    """
+    Recounts all the reports into the (emptied) rollup table.
+    """
+    await session.exec(delete(ReportRollup))
+    statement = insert(ReportRollup).from_select(
+        [*ROLLUP_KEYS, ReportRollup.count],
+        select_report_keys(session.bind.dialect.name),
+    )
+    await session.exec(statement)
+    await session.commit()
+
+
+async def main(command):
+    async with AsyncSession(async_engine) as session:
+        if command == "rebuild":
+            await rebuild(session)
+            rows = await session.exec(select(func.count()).select_from(ReportRollup))
+            print(f"report_rollup rebuilt, {rows.one()} rows")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["rebuild"])
+    asyncio.run(main(parser.parse_args().command))
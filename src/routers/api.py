@@ -1,45 +1,83 @@
-from datetime import datetime
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+import csv
+import hashlib
+import io
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from enum import Enum as PyEnum
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pydantic_core import to_json
+from sqlalchemy import func, insert, tuple_
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import Session, desc, select
-
-from ..db import get_session
-from ..dependencies import get_current_user
-from ..helpers import logger
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import joinedload
+from sqlmodel import desc, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..constants import BULK_CHUNK_SIZE, BULK_MAX_ITEMS, EXPORT_BATCH_SIZE, MAX_PAGE_SIZE
+from ..db import get_read_session, get_session
+from ..dependencies import get_current_user, response_cache, user_cache
+from ..helpers import logger, request_id
+from ..jobs import job_queue
 from ..models import (
+    BulkItemResult,
     Disease,
     DiseaseBase,
+    DiseaseCategory,
     Patient,
     PatientBase,
     Report,
     ReportBase,
+    ReportBundle,
+    ReportPage,
     ReportResponse,
+    ReportStats,
     Reporter,
     ReporterBase,
     ReportStatus,
+    SearchPage,
+    SeverityLevel,
 )
+from ..projection import Projection
+from ..rollup import RollupChange, period_bucket, rollup_stats
+from ..search import search_diseases
 
 router = APIRouter(prefix="/api")
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# the GET endpoints read from the replicas (if there are any, see db.EngineRouter)
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
 
 
-async def add_and_refresh_from_db(session, entity):
+async def add_and_refresh_from_db(session, entity, rollup=None):
     try:
         session.add(entity)
-        session.commit()
-        session.refresh(entity)
+        if rollup is not None:
+            await rollup.apply(session)
+        await session.commit()
+        await session.refresh(entity)
+        await invalidate_cached(session, entity)
     except IntegrityError as err:
-        session.rollback()
-        logger.error(str(err.args))
+        await session.rollback()
+        logger.error("%s", err.args)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(err.args[0]),
         ) from None
+    except StaleDataError:
+        # another request has updated it after it was read here
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="The record has been changed, fetch it again",
+        ) from None
     except Exception as err:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(err),
@@ -48,6 +86,252 @@ async def add_and_refresh_from_db(session, entity):
     return entity
 
 
+def select_reports():
+    """
+    SELECT for reports, together with their reporter, patient and disease
+    (joined in the same query).
+    """
+    return select(Report).options(
+        joinedload(Report.reporter),
+        joinedload(Report.patient),
+        joinedload(Report.disease),
+    )
+
+
+def report_response(report):
+    """
+    ReportResponse of a report loaded with its relations (see select_reports).
+    Built without validation, the data comes from our own DB.
+    """
+    return ReportResponse.model_construct(
+        **{name: getattr(report, name) for name in ReportResponse.model_fields}
+    )
+
+
+def report_projection(
+    fields: Annotated[
+        str | None,
+        Query(
+            description=(
+                "Only these fields of the reports (the ID is always there), comma "
+                "separated, e.g. `status,disease.name` (the disease with its ID "
+                "and name)."
+            ),
+        ),
+    ] = None,
+    include: Annotated[
+        str | None,
+        Query(
+            description=(
+                "Relations (reporter, patient, disease) with all their fields, "
+                "comma separated. Without `fields` and `include` the reports "
+                "have all the relations."
+            ),
+        ),
+    ] = None,
+):
+    """
+    Projection of the reports from the query parameters, None for whole reports.
+    """
+    if fields is None and include is None:
+        return None
+    try:
+        return Projection.parse(fields, include)
+    except ValueError as err:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(err),
+        ) from None
+
+
+ProjectionDep = Annotated[Projection | None, Depends(report_projection)]
+
+
+def select_projected(projection):
+    """
+    SELECT for the reports and how to turn the results into the response's items:
+    whole reports (select_reports) or only the projection's columns.
+    """
+    if projection is None:
+        return select_reports(), report_response
+    return projection.select(), projection.payload
+
+
+def json_response(content: bytes, **kwargs):
+    """
+    Response with the already serialised JSON. Returning it skips FastAPI's
+    validation (and serialisation) of the return value against the response model.
+    """
+    return Response(content, media_type="application/json", **kwargs)
+
+
+def encode_cursor(report):
+    """
+    Opaque pagination cursor, pointing at the given (last returned) report.
+    """
+    position = json.dumps([report.date_updated.isoformat(), report.id])
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        date_updated, id = json.loads(urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date_updated), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        ) from None
+
+
+def entity_version(entity):
+    """
+    What changes when the entity does: its version (or date_updated),
+    all its columns for anything else.
+    """
+    if entity is None:
+        return None
+    for name in ("version", "date_updated"):
+        if getattr(entity, name, None) is not None:
+            return type(entity).__name__, entity.id, getattr(entity, name)
+    return tuple(getattr(entity, column.key) for column in entity.__table__.columns)
+
+
+def entity_etag(*entities):
+    versions = [entity_version(entity) for entity in entities]
+    digest = hashlib.blake2b(repr(versions).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(header, etag):
+    # weak comparison, the ETags are weak anyway
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def check_if_match(request, *entities):
+    """
+    Raises 412 if the request's If-Match doesn't match the entities' current ETag,
+    i.e. somebody else has changed them since the client has read them.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    if entities[0] is None or not etag_matches(if_match, entity_etag(*entities)):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="The record has been changed, fetch it again",
+        )
+
+
+def validators(*entities):
+    """
+    The ETag (and Last-Modified) headers of a response made of the entities.
+    """
+    headers = {"ETag": entity_etag(*entities), "Cache-Control": "private, no-cache"}
+
+    # only when all the parts have timestamps, other changes wouldn't show in it
+    dates = [getattr(entity, "date_updated", None) for entity in entities if entity]
+    if dates and None not in dates:
+        last_modified = max(dates).replace(microsecond=0).astimezone(timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    return headers
+
+
+def is_not_modified(request, headers):
+    """
+    Whether the client's copy (If-None-Match / If-Modified-Since) is still current.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, headers["ETag"])
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            return (
+                parsedate_to_datetime(headers["Last-Modified"])
+                <= parsedate_to_datetime(if_modified_since)
+            )
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+async def cached_response(request, key):
+    """
+    The response from the cache (or 304 when the client has it), None on a miss.
+    A client that has just written reads the primary instead, an entry
+    cached from a lagging replica could miss its own changes.
+    """
+    if getattr(request.state, "read_your_writes", False):
+        return None
+
+    cached = await response_cache.get(key)
+    if cached is None:
+        return None
+
+    headers, body = cached.split(b"\n", 1)
+    headers = json.loads(headers)
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return json_response(body, headers=headers)
+
+
+async def cache_response(request, key, headers, payload):
+    """
+    Serialises the payload (a model) into the response, and caches it when it
+    was read from the primary. A lagging replica could still have the record
+    of before a write that has just dropped it from the cache.
+    """
+    body = payload.model_dump_json().encode()
+    if not getattr(request.state, "db_replica", False):
+        await response_cache.set(key, json.dumps(headers).encode() + b"\n" + body)
+    return json_response(body, headers=headers)
+
+
+# reports include these entities, their cached responses go when the entity changes
+REPORT_RELATIONS = {
+    "patient": Report.patient_id,
+    "disease": Report.disease_id,
+    "reporter": Report.reporter_id,
+}
+
+
+async def log_after_response(message, *args):
+    """
+    Logs the message of a successful write after the response (by a job),
+    with the ID of the request it's about.
+    """
+    await job_queue.enqueue(
+        "log", message=message, args=args, for_request=request_id.get()
+    )
+
+
+@job_queue.handler("log")
+async def log_message(message, args, for_request):
+    token = request_id.set(for_request)
+    try:
+        logger.info(message, *args)
+    finally:
+        request_id.reset(token)
+
+
+async def invalidate_cached(session, entity):
+    """
+    Drops the cached responses of the entity, and of the reports including it.
+    Before the response, so the client's next read can't get the old ones.
+    """
+    table = entity.__tablename__
+    keys = [f"{table}:{entity.id}"]
+    if table in REPORT_RELATIONS:
+        statement = select(Report.id).where(REPORT_RELATIONS[table] == entity.id)
+        keys += [f"report:{id}" for id in (await session.exec(statement)).all()]
+    await response_cache.invalidate(*keys)
+
+
 @router.post(
     "/reports", summary="Create new report", tags=["reports"]
 )
@@ -64,26 +348,228 @@ async def create_report(
         # TODO: Authorized user ID
         reporter_id=current_user.id,
     )
-    await add_and_refresh_from_db(session, report_db)
-
-    logger.info(
-        "Report successfully created"
+    await add_and_refresh_from_db(
+        session, report_db, RollupChange(lambda: Report.id == report_db.id)
     )
 
+    await log_after_response("Report successfully created")
+
     return report_db
 
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+# parameters SQLite (3.32+) takes in a statement, the bulk INSERTs are split by it
+SQLITE_MAX_VARIABLES = 32766
+
+
+async def parse_bulk_body(request):
+    """
+    Returns the uploaded items, either from a JSON array or from NDJSON lines.
+    Lines that aren't valid JSON are returned as exceptions (reported per item).
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as err:
+                items.append(err)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError as err:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON: {err}",
+            ) from None
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Expected an array of reports",
+            )
+
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many reports, the limit is {BULK_MAX_ITEMS}",
+        )
+
+    return items
+
+
+async def insert_many(session, model, rows):
+    """
+    Multi-row INSERT, returns the new IDs in the order of `rows`.
+
+    On SQLite the rows are sent in a single INSERT ... VALUES (...), (...)
+    (per SQLITE_MAX_VARIABLES parameters), which gives them consecutive IDs in
+    the order of VALUES, RETURNING has them in no particular order, so they're
+    sorted. (sort_by_parameter_order would insert them one by one there.)
+    """
+    if not rows:
+        return []
+    if session.bind.dialect.name != "sqlite":
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return (await session.exec(statement, params=rows)).scalars().all()
+
+    ids = []
+    per_statement = max(1, SQLITE_MAX_VARIABLES // len(rows[0]))
+    for start in range(0, len(rows), per_statement):
+        statement = (
+            insert(model)
+            .values(rows[start:start + per_statement])
+            .returning(model.id)
+        )
+        ids += sorted((await session.exec(statement)).scalars())
+    return ids
+
+
+async def insert_bundles(session, bundles, current_user):
+    """
+    Inserts patients, diseases and then the reports (linked to them),
+    with one multi-row INSERT per table. Doesn't commit.
+    """
+    with_patient = [bundle for bundle in bundles if bundle.patient]
+    with_disease = [bundle for bundle in bundles if bundle.disease]
+
+    patient_ids = iter(await insert_many(
+        session, Patient, [bundle.patient.model_dump() for bundle in with_patient]
+    ))
+    disease_ids = iter(await insert_many(
+        session,
+        Disease,
+        [
+            {**bundle.disease.model_dump(), "created_by": current_user.id}
+            for bundle in with_disease
+        ],
+    ))
+
+    rows = []
+    for bundle in bundles:
+        row = {**bundle.report.model_dump(), "reporter_id": current_user.id}
+        if bundle.patient:
+            row["patient_id"] = next(patient_ids)
+        if bundle.disease:
+            row["disease_id"] = next(disease_ids)
+        rows.append(row)
+
+    report_ids = await insert_many(session, Report, rows)
+    await RollupChange(lambda: Report.id.in_(report_ids)).apply(session)
+
+    return [
+        (report_id, row["patient_id"], row["disease_id"])
+        for row, report_id in zip(rows, report_ids, strict=True)
+    ]
+
+
+@router.post(
+    "/reports/bulk",
+    summary="Create reports in bulk",
+    description=(
+        "Accepts a JSON array, or NDJSON (`Content-Type: application/x-ndjson`), "
+        "of `{report, patient, disease}` bundles. Patient and disease are optional, "
+        "when present they are created and linked to the report. "
+        "Every item gets its own result, with `status_code` 201 when it was created."
+    ),
+    tags=["reports"],
+)
+async def create_reports_bulk(
+    request: Request,
+    session: SessionDep,
+    current_user: Annotated[ReporterBase, Depends(get_current_user)],
+) -> list[BulkItemResult]:
+    items = await parse_bulk_body(request)
+    logger.info("Creating %d Reports in bulk", len(items))
+
+    results = [None] * len(items)
+    valid = []
+
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            valid.append((index, ReportBundle.model_validate(item)))
+        except ValidationError as err:
+            results[index] = BulkItemResult(
+                index=index,
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=json.loads(err.json(include_url=False)),
+            )
+        except ValueError as err:
+            results[index] = BulkItemResult(
+                index=index,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON: {err}",
+            )
+
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        try:
+            bundles = [bundle for _, bundle in chunk]
+            ids = await insert_bundles(session, bundles, current_user)
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            # one bad item fails the whole chunk, find it by inserting one by one
+            ids = []
+            for _, bundle in chunk:
+                try:
+                    ids += await insert_bundles(session, [bundle], current_user)
+                    await session.commit()
+                except IntegrityError as err:
+                    await session.rollback()
+                    ids.append(err)
+        except Exception as err:
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(err),
+            ) from None
+
+        for (index, _), created in zip(chunk, ids, strict=True):
+            if isinstance(created, IntegrityError):
+                results[index] = BulkItemResult(
+                    index=index,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(created.args[0]),
+                )
+                continue
+            report_id, patient_id, disease_id = created
+            results[index] = BulkItemResult(
+                index=index,
+                status_code=status.HTTP_201_CREATED,
+                report_id=report_id,
+                patient_id=patient_id,
+                disease_id=disease_id,
+            )
+
+    await log_after_response(
+        "%d of %d Reports successfully created",
+        sum(r.status_code == status.HTTP_201_CREATED for r in results),
+        len(items),
+    )
+
+    return results
+
+
 @router.post(
     "/reports/{id}/reporter", summary="Add / update reporter details", tags=["reporter"]
 )
 async def create_reporter(
     id: int,
     reporter: ReporterBase,
+    request: Request,
     session: SessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ) -> Reporter:
-    logger.info(f"reporter ID: {id}, reporter data: {reporter}")
-    reporter_db = session.get(Reporter, id)
+    logger.info("Creating Reporter of Report %d", id)
+    reporter_db = await session.get(Reporter, id)
+    check_if_match(request, reporter_db)
 
     if not reporter_db:
         # Creating a new Reporter
@@ -94,20 +580,18 @@ async def create_reporter(
         )
         await add_and_refresh_from_db(session, reporter_db)
 
-        logger.info(
-            f"Reporter {reporter.first_name} "
-            f"{reporter.last_name} successfully created"
-        )
+        await log_after_response("Reporter of Report %d successfully created", id)
     else:
         # Updating an existing Reporter
         reporter_data = reporter.model_dump(exclude_unset=True)
+        # the username may change, the cached user is stored under the old one
+        username = reporter_db.username
         reporter_db.sqlmodel_update(reporter_data)
         await add_and_refresh_from_db(session, reporter_db)
+        user_cache.invalidate(username)
+        user_cache.invalidate(reporter_db.username)
 
-        logger.info(
-            f"Reporter {reporter.first_name} "
-            f"{reporter.last_name} successfully updated"
-        )
+        await log_after_response("Reporter of Report %d successfully updated", id)
 
     return reporter_db
 
@@ -118,11 +602,13 @@ async def create_reporter(
 async def create_patient(
     id: int,
     patient: PatientBase,
+    request: Request,
     session: SessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ) -> Patient:
-    logger.info(f"POST /reports/{id}/patient")
-    patient_db = session.get(Patient, id)
+    logger.info("Creating Patient of Report %d", id)
+    patient_db = await session.get(Patient, id)
+    check_if_match(request, patient_db)
 
     if not patient_db:
         # Creating a new Patient
@@ -132,18 +618,14 @@ async def create_patient(
         )
         await add_and_refresh_from_db(session, patient_db)
 
-        logger.info(
-            f"Patient {patient.first_name} {patient.last_name} successfully created"
-        )
+        await log_after_response("Patient of Report %d successfully created", id)
     else:
         # Updating an existing Patient
         patient_data = patient.model_dump(exclude_unset=True)
         patient_db.sqlmodel_update(patient_data)
         await add_and_refresh_from_db(session, patient_db)
 
-        logger.info(
-            f"Patient {patient.first_name} {patient.last_name} successfully updated"
-        )
+        await log_after_response("Patient of Report %d successfully updated", id)
 
     return patient_db
 
@@ -154,11 +636,15 @@ async def create_patient(
 async def create_disease(
     id: int,
     disease: DiseaseBase,
+    request: Request,
     session: SessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ) -> Disease:
-    logger.info(f"Create Disease endpoint, ID: {id}")
-    disease_db = session.get(Disease, id)
+    logger.info("Creating Disease of Report %d", id)
+    disease_db = await session.get(Disease, id)
+    check_if_match(request, disease_db)
+    # the reports (already) linked to the disease are counted by its category etc.
+    rollup = await RollupChange.start(session, lambda: Report.disease_id == id)
 
     # try:
     if not disease_db:
@@ -168,11 +654,9 @@ async def create_disease(
             id=id,
             created_by=current_user.id
         )
-        await add_and_refresh_from_db(session, disease_db)
+        await add_and_refresh_from_db(session, disease_db, rollup)
 
-        logger.info(
-            f"Disease <{disease.name}> successfully created"
-        )
+        await log_after_response("Disease <%s> successfully created", disease.name)
     else:
         # Updating an existing Disease
         disease_data = disease.model_dump(exclude_unset=True)
@@ -183,11 +667,9 @@ async def create_disease(
             "updated_by": current_user.id,
             "date_updated": datetime.now()
         })
-        await add_and_refresh_from_db(session, disease_db)
+        await add_and_refresh_from_db(session, disease_db, rollup)
 
-        logger.info(
-            f"Disease <{disease.name}> successfully updated"
-        )
+        await log_after_response("Disease <%s> successfully updated", disease.name)
 
     return disease_db
 
@@ -196,11 +678,13 @@ async def create_disease(
 async def update_report(
     id: int,
     report: ReportBase,
+    request: Request,
     session: SessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ):
-    logger.info(f"Updating Report with ID: {id}")
-    report_db = session.get(Report, id)
+    logger.info("Updating Report with ID: %d", id)
+    # with the relations, they are part of the report's ETag
+    report_db = (await session.exec(select_reports().where(Report.id == id))).first()
 
     if not report_db:
         raise HTTPException(
@@ -214,27 +698,30 @@ async def update_report(
     #         detail=str("Report cannot be modified"),
     #     )
 
-        # Updating existing Report
-        report_data = report.model_dump(exclude_unset=True)
-        # TODO: updated_by should come from authentication/authorization process
-        report_db.sqlmodel_update({
-            **report_data,
-            "updated_by": 1,
-            "date_updated": datetime.now()
-        })
-        await add_and_refresh_from_db(session, report_db)
+    check_if_match(
+        request, report_db, report_db.disease, report_db.patient, report_db.reporter
+    )
 
-        logger.info(
-            f"Report <{id}> successfully updated"
-        )
+    # Updating existing Report
+    rollup = await RollupChange.start(session, lambda: Report.id == id)
+    report_data = report.model_dump(exclude_unset=True)
+    # TODO: updated_by should come from authentication/authorization process
+    report_db.sqlmodel_update({
+        **report_data,
+        "updated_by": 1,
+        "date_updated": datetime.now()
+    })
+    await add_and_refresh_from_db(session, report_db, rollup)
+
+    await log_after_response("Report <%d> successfully updated", id)
 
     return report_db
 
 
 @router.delete("/reports/{id}", summary="Delete report (draft only)", tags=["reports"])
 async def delete_report(id: int, session: SessionDep):
-    logger.info(f"Deleting Report with ID: {id}")
-    report_db = session.get(Report, id)
+    logger.info("Deleting Report with ID: %d", id)
+    report_db = await session.get(Report, id)
 
     if not report_db:
         raise HTTPException(
@@ -250,89 +737,283 @@ async def delete_report(id: int, session: SessionDep):
 
     try:
         # Deleting existing Report
-        session.delete(report_db)
-        session.commit()
+        rollup = await RollupChange.start(session, lambda: Report.id == id)
+        await session.delete(report_db)
+        await rollup.apply(session)
+        await session.commit()
+        await response_cache.invalidate(f"report:{id}")
 
         statement = select(Report).where(Report.id == id)
-        results = session.exec(statement)
+        results = await session.exec(statement)
         report_db = results.first()
 
         if report_db:
             raise Exception("Report was not deleted", report_db)
 
-        logger.info(
-            f"Report <{id}> successfully updated"
-        )
     except Exception as err:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(err),
         ) from None
 
+    await log_after_response("Report <%d> successfully deleted", id)
+
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.get("/reports/recent", summary="Recent submissions", tags=["reports"])
 async def get_recent(
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
+    projection: ProjectionDep = None,
 ) -> ReportResponse:
     logger.info("Recent submission")
+    statement, payload = select_projected(projection)
     try:
     # Is it only going to return "Submitted" reports?
-        report = session.exec(
-            select(Report)
+        report = (await session.exec(
+            statement
                 .where(Report.status == ReportStatus.submitted)
                 .order_by(desc(Report.date_updated))
-        ).first()
-        reporter = (
-            session.exec(select(Reporter).where(Reporter.id == report.reporter_id)).first()
-        )
-        patient = session.exec(select(Patient).where(Patient.id == report.patient_id)).first()
-        disease = session.exec(select(Disease).where(Disease.id == report.disease_id)).first()
-
+                .limit(1)
+        )).first()
     except Exception as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(err),
         ) from None
-    raport_data = ReportResponse(
-        **{
-            **report.model_dump(),
-            "reporter": reporter,
-            "patient": patient,
-            "disease": disease
-        }
-    )
+
     if not report:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str("Reports do not exist"),
         )
 
-    return raport_data
+    return json_response(to_json(payload(report)))
+
+
+def report_filters(
+    report_status: ReportStatus | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    reporter_id: int | None = None,
+    category: DiseaseCategory | None = None,
+    severity_level: SeverityLevel | None = None,
+):
+    """
+    WHERE clauses for the report listings, from the (optional) query parameters.
+    The dates are compared with the report's creation date.
+    Every one of them can be answered from an index (see the models).
+    """
+    filters = []
+    if report_status is not None:
+        filters.append(Report.status == report_status)
+    if date_from is not None or date_to is not None:
+        # always both bounds, the planner takes a one-sided range for a large part
+        # of the table and would rather read all of it in the listing's order
+        filters.append(Report.date_created >= (date_from or datetime.min))
+        filters.append(Report.date_created < (date_to or datetime.max))
+    if reporter_id is not None:
+        filters.append(Report.reporter_id == reporter_id)
+
+    # the diseases are looked up first, then their reports (by disease_id)
+    disease_filters = []
+    if category is not None:
+        disease_filters.append(Disease.category == category)
+    if severity_level is not None:
+        disease_filters.append(Disease.severity_level == severity_level)
+    if disease_filters:
+        filters.append(Report.disease_id.in_(select(Disease.id).where(*disease_filters)))
+
+    return filters
+
+
+# flat rows, reports with the most useful bits of their disease and reporter
+EXPORT_COLUMNS = (
+    Report.id,
+    Report.status,
+    Report.date_created,
+    Report.date_updated,
+    Report.reporter_id,
+    Report.updated_by,
+    Report.patient_id,
+    Report.disease_id,
+    Reporter.organization_name,
+    Disease.name.label("disease_name"),
+    Disease.category.label("disease_category"),
+    Disease.severity_level,
+    Disease.treatment_status,
+    Disease.date_detected,
+)
+
+
+def export_value(value):
+    if isinstance(value, PyEnum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def export_rows(session, statement, export_format):
+    """
+    Yields the encoded rows, read in batches from a server side cursor.
+    """
+    statement = statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+    result = await session.stream(statement)
+    names = list(result.keys())
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+
+    async for rows in result.partitions():
+        if export_format == "csv":
+            writer.writerows([export_value(value) for value in row] for row in rows)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(
+                json.dumps(dict(zip(names, map(export_value, row), strict=True)))
+                + "\n"
+                for row in rows
+            )
+        yield chunk
+
+    if export_format == "csv" and buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/reports/export", summary="Export reports (NDJSON / CSV)", tags=["reports"])
+async def export_reports(
+    session: ReadSessionDep,
+    current_user: Annotated[ReporterBase, Depends(get_current_user)],
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+    report_status: Annotated[ReportStatus | None, Query(alias="status")] = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+):
+    logger.info("Exporting Reports as %s", export_format)
+    statement = (
+        select(*EXPORT_COLUMNS)
+        .outerjoin(Reporter, Reporter.id == Report.reporter_id)
+        .outerjoin(Disease, Disease.id == Report.disease_id)
+        .where(*report_filters(report_status, date_from, date_to))
+        .order_by(Report.id)
+    )
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        export_rows(session, statement, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="reports.{export_format}"'
+        },
+    )
+
+
+@router.get("/stats", summary="Report statistics", tags=["reports"])
+async def get_stats(
+    session: ReadSessionDep,
+    current_user: Annotated[ReporterBase, Depends(get_current_user)],
+    organization: str | None = None,
+    period: Literal["day", "week"] = "day",
+    report_status: Annotated[ReportStatus | None, Query(alias="status")] = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+) -> ReportStats:
+    """
+    Counts of the reports grouped by their disease's category, severity,
+    the day/week it was detected and by the report status, all counted by the DB.
+    Without the organisation and date filters they are read from the rollup table.
+    """
+    if organization is None and date_from is None and date_to is None:
+        return await rollup_stats(session, period, report_status)
+
+    filters = report_filters(report_status, date_from, date_to)
+    if organization is not None:
+        filters.append(
+            Report.reporter_id.in_(
+                select(Reporter.id).where(Reporter.organization_name == organization)
+            )
+        )
+
+    async def count_by(column):
+        statement = (
+            select(column, func.count(Report.id))
+            .outerjoin(Disease, Disease.id == Report.disease_id)
+            .where(*filters)
+            .group_by(column)
+            .order_by(column)
+        )
+        return [tuple(row) for row in await session.exec(statement)]
+
+    by_status = await count_by(Report.status)
+    return ReportStats(
+        total=sum(count for _, count in by_status),
+        by_category=await count_by(Disease.category),
+        by_severity=await count_by(Disease.severity_level),
+        by_status=by_status,
+        by_period=await count_by(
+            period_bucket(Disease.date_detected, period, session.bind.dialect.name)
+        ),
+    )
+
+
+@router.get("/search", summary="Search symptoms and lab results", tags=["disease"])
+async def search(
+    session: ReadSessionDep,
+    current_user: Annotated[ReporterBase, Depends(get_current_user)],
+    q: Annotated[
+        str,
+        Query(
+            min_length=1,
+            max_length=200,
+            description=(
+                "Words the disease's symptoms or lab results must all contain "
+                "(any form of them, e.g. cough finds coughing), "
+                "a trailing * matches the start of a word."
+            ),
+        ),
+    ],
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = 20,
+) -> SearchPage:
+    """
+    Diseases matching the words, best matches first (of the SEARCH_RANK_WINDOW
+    most recently added ones), with the matching parts of the texts
+    and the IDs of their reports.
+    """
+    if session.bind.dialect.name != "sqlite":
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search needs the SQLite full-text index",
+        )
+
+    page = await search_diseases(session, q, offset, limit)
+    return json_response(page.model_dump_json().encode())
 
 
 @router.get("/reports/{id}", summary="Get specific report", tags=["reports"])
 async def get_report(
     id: int,
-    session: SessionDep,
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
+    projection: ProjectionDep = None,
 ) -> ReportResponse:
+    # only the whole reports are cached (and have validators)
+    if projection is None:
+        cached = await cached_response(request, f"report:{id}")
+        if cached is not None:
+            return cached
+
+    statement, payload = select_projected(projection)
     try:
-        report = session.get(Report, id)
-        reporter = (
-            session.exec(
-                select(Reporter).where(Reporter.id == report.reporter_id)
-            ).first()
-        )
-        patient = (
-            session.exec(select(Patient).where(Patient.id == report.patient_id)).first()
-        )
-        disease = (
-            session.exec(select(Disease).where(Disease.id == report.disease_id)).first()
-        )
+        report = (await session.exec(statement.where(Report.id == id))).first()
     except Exception as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -345,86 +1026,99 @@ async def get_report(
             detail=str("Report does not exist"),
         )
 
-    report_data = ReportResponse(
-        **{
-            **report.model_dump(),
-            "reporter": reporter,
-            "patient": patient,
-            "disease": disease
-        }
-    )
+    if projection is not None:
+        return json_response(to_json(payload(report)))
 
-    return report_data
+    headers = validators(report, report.disease, report.patient, report.reporter)
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return await cache_response(
+        request, f"report:{id}", headers, report_response(report)
+    )
 
 
 @router.get("/reports", summary="List reports (paginated)", tags=["reports"])
 async def get_reports(
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
     offset: int = 0,
-    limit: Annotated[int, Query(le=20)] = 20,
-) -> list[ReportResponse]:
-    try:
-        reports = session.exec(select(Report).offset(offset).limit(limit)).all()
-        all_results = []
-        reporter_ids = set()
-        patient_ids = set()
-        disease_ids = set()
-
-        for report in reports:
-            reporter_ids.add(report.reporter_id)
-            patient_ids.add(report.patient_id)
-            disease_ids.add(report.disease_id)
-
-        reporters = (
-            session.exec(select(Reporter).where(Reporter.id.in_(reporter_ids)))
-            .all()
-        )
-        patients = (
-            session.exec(select(Patient).where(Patient.id.in_(patient_ids)))
-            .all()
-        )
-        diseases = (
-            session.exec(select(Disease).where(Disease.id.in_(disease_ids)))
-            .all()
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = 20,
+    report_status: Annotated[ReportStatus | None, Query(alias="status")] = None,
+    reporter_id: int | None = None,
+    category: DiseaseCategory | None = None,
+    severity_level: SeverityLevel | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    cursor: Annotated[
+        str | None,
+        Query(
+            description=(
+                "Keyset pagination, newest reports first. "
+                "Pass an empty value for the first page, then `next_cursor` "
+                "from the previous page (`offset` is ignored)."
+            ),
+        ),
+    ] = None,
+    projection: ProjectionDep = None,
+) -> list[ReportResponse] | ReportPage:
+    page = select(Report.id).where(
+        *report_filters(
+            report_status, date_from, date_to, reporter_id, category, severity_level
         )
+    )
 
-        for report in reports:
-            reporter = [r for r in reporters if r.id == report.reporter_id][0]
-            patient = [p for p in patients if p.id == report.patient_id][0]
-            disease = [d for d in diseases if d.id == report.disease_id][0]
-            all_results.append(ReportResponse(
-                **{
-                    **report.model_dump(),
-                    "reporter": reporter,
-                    "patient": patient,
-                    "disease": disease,
-                }
-            ))
-
-    except IndexError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="DB data inconsistency"
-        ) from None
+    if cursor is None:
+        order = (Report.id,)
+        page = page.order_by(*order).offset(offset).limit(limit)
+    else:
+        order = (desc(Report.date_updated), desc(Report.id))
+        # one extra row tells whether there's a next page
+        page = page.order_by(*order).limit(limit + 1)
+        if cursor:
+            page = page.where(
+                tuple_(Report.date_updated, Report.id) < tuple_(*decode_cursor(cursor))
+            )
+
+    # The page's IDs are picked first (from the indexes, when the filters match
+    # many reports only the IDs are sorted), and only its reports are joined.
+    statement, payload = select_projected(projection)
+    statement = statement.where(Report.id.in_(page)).order_by(*order)
+
+    try:
+        # relations are joined by their IDs in SQL,
+        # so there's no need to match them up here
+        reports = (await session.exec(statement)).all()
     except Exception as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(err),
         ) from None
 
+    if cursor is not None:
+        next_cursor = encode_cursor(reports[limit - 1]) if len(reports) > limit else None
+        page = {
+            "items": [payload(report) for report in reports[:limit]],
+            "next_cursor": next_cursor,
+        }
+        return json_response(to_json(page))
+
     if not reports:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str("Reports do not exist"),
         )
 
-    return all_results
+    return json_response(to_json([payload(report) for report in reports]))
+
 
+async def get_entity(request, session, model, id):
+    key = f"{model.__tablename__}:{id}"
+    cached = await cached_response(request, key)
+    if cached is not None:
+        return cached
 
-async def get_entity(session, model, id):
     try:
-        entity = session.get(model, id)
+        entity = await session.get(model, id)
     except Exception as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -437,31 +1131,37 @@ async def get_entity(session, model, id):
             detail=str("The Disease record was not found"),
         )
 
-    return entity
+    headers = validators(entity)
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return await cache_response(request, key, headers, entity)
 
 
 @router.get("/reports/{id}/reporter", summary="Get reporter details", tags=["reporter"])
 async def get_reporter(
     id: int,
-    session: SessionDep,
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ) -> Reporter:
-    return await get_entity(session, Reporter, id)
+    return await get_entity(request, session, Reporter, id)
 
 
 @router.get("/reports/{id}/patient", summary="Get patient details", tags=["patient"])
 async def get_patient(
     id: int,
-    session: SessionDep,
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ):
-    return await get_entity(session, Patient, id)
+    return await get_entity(request, session, Patient, id)
 
 
 @router.get("/reports/{id}/disease", summary="Get disease details", tags=["disease"])
 async def get_disease(
     id: int,
-    session: SessionDep,
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[ReporterBase, Depends(get_current_user)],
 ):
-    return await get_entity(session, Disease, id)
+    return await get_entity(request, session, Disease, id)
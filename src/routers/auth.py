@@ -1,4 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from time import perf_counter
 from typing import Annotated
 
 import jwt
@@ -6,17 +9,74 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pwdlib import PasswordHash
 
-from ..constants import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
-from ..dependencies import get_user
-from ..models import (
-    Token,
+from ..constants import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    PASSWORD_HASH_WORKERS,
+    SECRET_KEY,
 )
+from ..dependencies import get_user
+from ..models import Token
 
 router = APIRouter(prefix="")
 
 password_hash = PasswordHash.recommended()
 
 
+class PasswordHashPool:
+    """
+    Runs password hashing functions in a bounded pool of threads.
+
+    argon2 is CPU and memory heavy on purpose, so it can't run on the event loop,
+    and only `workers` hashes are computed at once, the rest wait in the queue.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+
+    async def run(self, func, *args):
+        queued_at = perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        waited = perf_counter() - queued_at
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "wait_seconds": self.wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS)
+
+
 def verify_password(plain_password, hashed_password):
     return password_hash.verify(plain_password, hashed_password)
 
@@ -25,13 +85,13 @@ def get_password_hash(password):
     return password_hash.hash(password)
 
 
-def authenticate_user(username: str, password: str):
-    user = get_user(username)
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username)
 
     if not user:
         return False
 
-    if not verify_password(password, user.hashed_password):
+    if not await password_hash_pool.run(verify_password, password, user.hashed_password):
         return False
 
     return user
@@ -55,7 +115,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,13 +1,23 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 
-from ..dependencies import get_current_active_user
-from ..models import (
-    # UserBase,
-    ReporterBase,
+from ..compression import compression_stats
+from ..db import engines, pool_stats
+from ..dependencies import get_current_active_user, response_cache, user_cache
+from ..helpers import log_stats
+from ..jobs import job_queue
+from ..metrics import (
+    compression_cpu,
+    compression_ratio,
+    render_gauges,
+    request_db_duration,
+    request_duration,
+    request_queries,
 )
-
+from ..models import ReporterBase
+from .auth import password_hash_pool
 
 router = APIRouter(prefix="")
 
@@ -26,4 +36,38 @@ async def read_own_items(
 @router.get("/healthcheck", response_model=dict, summary="Healthcheck")
 async def healthy():
 
-    return {"status": "OK"}
+    return {"status": "OK", "db_pool": pool_stats()}
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Metrics (Prometheus text format) of this worker",
+)
+async def metrics():
+    sections = [
+        request_duration.render(),
+        request_queries.render(),
+        request_db_duration.render(),
+        compression_ratio.render(),
+        compression_cpu.render(),
+        render_gauges("compression", "Response compression totals.", compression_stats),
+        render_gauges("db_pool", "DB connection pool state.", pool_stats()),
+        render_gauges("db_reads", "Reads by the DB they went to.", engines.stats),
+        render_gauges("user_cache", "Authenticated users cache.", user_cache.stats()),
+        render_gauges(
+            "response_cache", "Cached record responses.", await response_cache.stats()
+        ),
+        render_gauges(
+            "password_hash_pool", "Password hashing threads.", password_hash_pool.stats()
+        ),
+        render_gauges(
+            "job_queue", "Jobs run after the responses.", await job_queue.stats()
+        ),
+        render_gauges(
+            "logging", "Log records queued, sampled out and dropped.", log_stats
+        ),
+    ]
+    return PlainTextResponse(
+        "\n".join(sections) + "\n", media_type="text/plain; version=0.0.4"
+    )
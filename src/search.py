@@ -0,0 +1,166 @@
+"""
+Full-text search over the diseases' symptoms and lab results, with the SQLite FTS5
+index `disease_fts` (created together with the disease table, see models.py).
+
+If the index ever gets out of sync (e.g. a batch migration recreated the disease
+table and dropped its triggers), recreate the triggers and reindex:
+
+    python -m src.search rebuild
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import column, func, literal_column, table, text
+from sqlmodel import desc, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .constants import SEARCH_RANK_WINDOW
+from .db import async_engine
+from .models import DISEASE_FTS_DDL, Disease, Report, SearchHit, SearchPage
+
+disease_fts = table("disease_fts", column("rowid"))
+DISEASE_FTS = literal_column("disease_fts")
+
+SNIPPET_TOKENS = 12
+
+
+def match_query(query):
+    """
+    FTS5 query matching all the words of `query`, a trailing * matches a prefix.
+    The words are quoted, so FTS5 syntax in them (AND, NEAR, column:...) is just text.
+    """
+    terms = []
+    for word in query.split():
+        prefix = "*" if word.endswith("*") else ""
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"{prefix}')
+    return " ".join(terms)
+
+
+def snippet(column_index):
+    return func.snippet(
+        DISEASE_FTS, column_index, "<mark>", "</mark>", "…", SNIPPET_TOKENS
+    )
+
+
+async def select_hits(session, match, window_start, ranked, offset, limit):
+    """
+    The matches from `window_start` (rowid) on by rank if `ranked`, or the ones
+    before it newest first (their rank is there, but they aren't ordered by it).
+    """
+    rank = func.bm25(DISEASE_FTS)
+    rowid = disease_fts.c.rowid
+    hits = (
+        select(
+            rowid,
+            snippet(0).label("symptoms"),
+            snippet(1).label("lab_results"),
+            rank.label("rank"),
+        )
+        .where(
+            DISEASE_FTS.match(match),
+            rowid >= window_start if ranked else rowid < window_start,
+        )
+        .order_by(rank if ranked else desc(rowid))
+        .offset(offset)
+        .limit(limit)
+        .subquery()
+    )
+    report_ids = (
+        select(func.json_group_array(Report.id))
+        .where(Report.disease_id == Disease.id)
+        .scalar_subquery()
+    )
+    statement = (
+        select(
+            Disease.id.label("disease_id"),
+            Disease.name,
+            Disease.category,
+            Disease.severity_level,
+            Disease.date_detected,
+            report_ids.label("report_ids"),
+            hits.c.symptoms,
+            hits.c.lab_results,
+            hits.c.rank,
+        )
+        .join(hits, hits.c.rowid == Disease.id)
+        .order_by(hits.c.rank if ranked else desc(hits.c.rowid))
+    )
+    return (await session.exec(statement)).all()
+
+
+async def search_diseases(session, query, offset, limit) -> SearchPage:
+    match = match_query(query)
+    if not match:
+        return SearchPage(items=[], next_offset=None)
+
+    # Ranking has to score every match, so only the most recent ones are ranked,
+    # the older ones follow them newest first. FTS5 reads the matches in rowid
+    # order and filters a rowid range cheaply.
+    newest = (
+        select(disease_fts.c.rowid)
+        .where(DISEASE_FTS.match(match))
+        .order_by(desc(disease_fts.c.rowid))
+        .limit(SEARCH_RANK_WINDOW)
+        .subquery()
+    )
+    window_start = select(func.min(newest.c.rowid)).scalar_subquery()
+    # one extra row tells whether there's a next page
+    rows = await select_hits(session, match, window_start, True, offset, limit + 1)
+    if len(rows) <= limit:
+        # the page reaches past the ranked ones
+        if rows:
+            window = offset + len(rows)
+        else:
+            window = (
+                await session.exec(select(func.count()).select_from(newest))
+            ).one()
+        # there are older matches only if the window is full
+        if window == SEARCH_RANK_WINDOW:
+            rows += await select_hits(
+                session,
+                match,
+                window_start,
+                False,
+                max(0, offset - window),
+                limit + 1 - len(rows),
+            )
+
+    # the data comes from our own DB, no need to validate it
+    items = [
+        SearchHit.model_construct(
+            **{**row._mapping, "report_ids": json.loads(row.report_ids)}
+        )
+        for row in rows[:limit]
+    ]
+    return SearchPage.model_construct(
+        items=items,
+        next_offset=offset + limit if len(rows) > limit else None,
+    )
+
+
+async def rebuild(session):
+    """
+    Creates the index and its triggers (if missing), and reindexes all the diseases.
+    """
+    for statement in DISEASE_FTS_DDL:
+        await session.exec(text(statement))
+    await session.exec(text("INSERT INTO disease_fts (disease_fts) VALUES ('rebuild')"))
+    await session.commit()
+
+
+async def main(command):
+    async with AsyncSession(async_engine) as session:
+        if command == "rebuild":
+            await rebuild(session)
+            rows = await session.exec(select(func.count()).select_from(disease_fts))
+            print(f"disease_fts rebuilt, {rows.one()} rows")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["rebuild"])
+    asyncio.run(main(parser.parse_args().command))
@@ -0,0 +1,155 @@
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from ..cache import (
+    BytesCache,
+    MemoryBytesCache,
+    SQLiteBytesCache,
+    TTLCache,
+    make_bytes_cache,
+)
+
+
+class TestTTLCache(TestCase):
+    def test_hits_and_misses(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+
+        assert cache.get("johndoe") is None
+        cache.set("johndoe", 1)
+        assert cache.get("johndoe") == 1
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 2}
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+
+        with patch("src.cache.monotonic", return_value=1000):
+            cache.set("a", 1)
+        with patch("src.cache.monotonic", return_value=1059):
+            assert cache.get("a") == 1
+        with patch("src.cache.monotonic", return_value=1061):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_invalidate(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.invalidate("a")
+        cache.invalidate("not there")
+
+        assert cache.get("a") is None
+
+
+class TestMemoryBytesCache(IsolatedAsyncioTestCase):
+    async def test_bounded_by_bytes(self):
+        cache = MemoryBytesCache(maxbytes=10, ttl=60)
+        await cache.set("a", b"1234")
+        await cache.set("b", b"1234")
+        await cache.get("a")
+        await cache.set("c", b"1234")
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"1234"
+        assert (await cache.stats())["bytes"] == 8
+
+        await cache.set("too big", b"x" * 11)
+        assert await cache.get("too big") is None
+        assert len(cache) == 2
+
+    async def test_replace_and_invalidate(self):
+        cache = MemoryBytesCache(maxbytes=10, ttl=60)
+        await cache.set("a", b"1234")
+        await cache.set("a", b"12")
+        assert (await cache.stats())["bytes"] == 2
+
+        await cache.set("b", b"34")
+        await cache.set("c", b"56")
+        await cache.invalidate("a", "b", "not there")
+        assert await cache.get("a") is None
+        assert await cache.get("b") is None
+        assert (await cache.stats())["bytes"] == 2
+
+    async def test_entries_expire(self):
+        cache = MemoryBytesCache(maxbytes=10, ttl=60)
+
+        with patch("src.cache.monotonic", return_value=1000):
+            await cache.set("a", b"1")
+        with patch("src.cache.monotonic", return_value=1061):
+            assert await cache.get("a") is None
+        assert (await cache.stats())["bytes"] == 0
+
+    async def test_none_backend_stores_nothing(self):
+        cache = make_bytes_cache("none", maxbytes=10, ttl=60)
+        await cache.set("a", b"1")
+
+        assert await cache.get("a") is None
+
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BytesCache()
+
+
+class TestSQLiteBytesCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.db")
+
+    async def test_shared_between_instances(self):
+        # e.g. two uvicorn workers
+        first = SQLiteBytesCache(self.path, maxbytes=100, ttl=60)
+        second = SQLiteBytesCache(self.path, maxbytes=100, ttl=60)
+
+        await first.set("a", b"1234")
+        await first.set("b", b"56")
+        assert await second.get("a") == b"1234"
+        assert (await second.stats())["bytes"] == 6
+
+        await second.invalidate("a", "b", "not there")
+        assert await first.get("a") is None
+        stats = await first.stats()
+        assert (stats["misses"], stats["bytes"]) == (1, 0)
+
+    async def test_entries_expire(self):
+        cache = SQLiteBytesCache(self.path, maxbytes=100, ttl=60)
+
+        with patch("src.cache.time", return_value=1000):
+            await cache.set("a", b"1")
+        with patch("src.cache.time", return_value=1061):
+            assert await cache.get("a") is None
+
+    async def test_bounded_by_bytes(self):
+        cache = SQLiteBytesCache(self.path, maxbytes=10, ttl=60)
+        for key in "abcd":
+            await cache.set(key, b"1234")
+
+        assert (await cache.stats())["bytes"] <= 10
+        assert await cache.get("d") == b"1234"
+
+    async def test_size_is_kept_by_the_writes(self):
+        cache = SQLiteBytesCache(self.path, maxbytes=100, ttl=60)
+        await cache.set("a", b"1234")
+        await cache.set("b", b"12")
+        await cache.set("a", b"123")
+        stats = await cache.stats()
+        assert (stats["size"], stats["bytes"]) == (2, 5)
+
+        # an existing file is counted when it's opened
+        reopened = SQLiteBytesCache(self.path, maxbytes=100, ttl=60)
+        assert (await reopened.stats())["bytes"] == 5
+
+        await cache.clear()
+        stats = await reopened.stats()
+        assert (stats["size"], stats["bytes"]) == (0, 0)
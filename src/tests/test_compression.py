@@ -0,0 +1,103 @@
+import gzip
+import json
+from unittest import TestCase, skipIf
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from ..compression import CompressionMiddleware, brotli, negotiate
+
+ROWS = [{"id": id, "symptoms": "fever, cough, headache"} for id in range(100)]
+
+
+async def reports(request):
+    return JSONResponse(ROWS)
+
+
+async def small(request):
+    return JSONResponse({"status": "OK"})
+
+
+async def export(request):
+    async def lines():
+        for row in ROWS:
+            yield json.dumps(row) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def image(request):
+    return StreamingResponse(iter([b"\x89PNG" * 1000]), media_type="image/png")
+
+
+def make_client(encodings=("br", "gzip")):
+    app = Starlette(routes=[
+        Route("/reports", reports),
+        Route("/small", small),
+        Route("/export", export),
+        Route("/image", image),
+    ])
+    app.add_middleware(
+        CompressionMiddleware,
+        encodings=list(encodings),
+        minimum_size=500,
+        media_types=["application/json", "application/x-ndjson"],
+    )
+    return TestClient(app)
+
+
+class TestNegotiate(TestCase):
+    def test_client_preference_first_then_server_order(self):
+        assert negotiate("gzip, br", ["br", "gzip"]) == "br"
+        assert negotiate("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+        assert negotiate("*", ["br", "gzip"]) == "br"
+        assert negotiate("gzip;q=0, *;q=0.1", ["gzip"]) is None
+        assert negotiate("identity", ["br", "gzip"]) is None
+        assert negotiate("", ["gzip"]) is None
+
+
+class TestCompressionMiddleware(TestCase):
+    def test_large_responses_are_compressed(self):
+        client = make_client(["gzip"])
+        response = client.get("/reports", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < len(json.dumps(ROWS)) / 4
+        assert response.json() == ROWS
+
+    def test_small_and_other_responses_are_not(self):
+        client = make_client(["gzip"])
+
+        response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+        response = client.get("/reports", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.json() == ROWS
+
+        response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert "vary" not in response.headers
+
+    def test_streamed_responses_are_compressed_as_they_go(self):
+        client = make_client(["gzip"])
+        with client.stream(
+            "GET", "/export", headers={"Accept-Encoding": "gzip"}
+        ) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            body = b"".join(response.iter_raw())
+
+        lines = gzip.decompress(body).decode().splitlines()
+        assert [json.loads(line) for line in lines] == ROWS
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        client = make_client(["br", "gzip"])
+        response = client.get("/reports", headers={"Accept-Encoding": "gzip, br"})
+
+        assert response.headers["content-encoding"] == "br"
+        assert response.json() == ROWS
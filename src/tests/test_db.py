@@ -0,0 +1,113 @@
+import sqlite3
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from ..db import STICKY_COOKIE, EngineRouter, StickyPrimaryMiddleware, make_engine
+
+
+class TestMakeEngine(IsolatedAsyncioTestCase):
+    async def test_sqlite_pragmas_are_set(self):
+        with TemporaryDirectory() as directory:
+            engine = make_engine(
+                f"sqlite+aiosqlite:///{directory}/test.db", create_async_engine
+            )
+            async with engine.connect() as conn:
+                journal_mode = await conn.scalar(text("PRAGMA journal_mode"))
+                synchronous = await conn.scalar(text("PRAGMA synchronous"))
+                busy_timeout = await conn.scalar(text("PRAGMA busy_timeout"))
+            await engine.dispose()
+
+        assert journal_mode == "wal"
+        assert synchronous == 1  # NORMAL
+        assert busy_timeout == 5000
+        assert engine.pool.size() == 5
+        assert engine.echo is False
+
+    def test_in_memory_sqlite_has_no_pool_options(self):
+        engine = make_engine("sqlite://")
+        with engine.connect() as conn:
+            assert conn.scalar(text("SELECT 1")) == 1
+        assert type(engine.pool).__name__ == "SingletonThreadPool"
+
+
+def make_database(directory, name):
+    # a stand-in for the primary / a replica, it knows which one it is
+    path = f"{directory}/{name}.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE db (name TEXT)")
+        conn.execute("INSERT INTO db VALUES (?)", (name,))
+    # TestClient runs every request in a new event loop, so no pooled connections
+    return create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+
+
+def make_client(router):
+    async def read(request):
+        async with AsyncSession(router.read_engine(request)) as session:
+            name = await session.scalar(text("SELECT name FROM db"))
+        return JSONResponse({"db": name})
+
+    async def write(request):
+        router.write_engine(request)
+        return JSONResponse({}, status_code=int(request.query_params["status"]))
+
+    app = Starlette(routes=[
+        Route("/read", read),
+        Route("/write", write, methods=["POST"]),
+    ])
+    app.add_middleware(StickyPrimaryMiddleware, router=router)
+    return TestClient(app)
+
+
+class TestEngineRouter(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.primary = make_database(directory.name, "primary")
+        self.replicas = [
+            make_database(directory.name, "replica1"),
+            make_database(directory.name, "replica2"),
+        ]
+
+    def test_reads_go_to_the_replicas_in_turn(self):
+        client = make_client(EngineRouter(self.primary, self.replicas))
+
+        names = [client.get("/read").json()["db"] for _ in range(4)]
+
+        assert names == ["replica1", "replica2", "replica1", "replica2"]
+
+    def test_client_reads_its_writes_from_the_primary(self):
+        router = EngineRouter(self.primary, self.replicas, sticky_seconds=60)
+        client = make_client(router)
+
+        response = client.post("/write?status=400")
+        assert "set-cookie" not in response.headers
+        assert client.get("/read").json()["db"] == "replica1"
+
+        response = client.post("/write?status=201")
+        assert STICKY_COOKIE in response.cookies
+        assert client.get("/read").json()["db"] == "primary"
+        assert router.stats["sticky_reads"] == 1
+
+        # other clients still read from the replicas
+        assert make_client(router).get("/read").json()["db"] == "replica2"
+
+        # and this one, when the cookie expires
+        client.cookies.set(STICKY_COOKIE, str(int(time()) - 1))
+        assert client.get("/read").json()["db"] == "replica1"
+
+    def test_without_replicas_everything_goes_to_the_primary(self):
+        client = make_client(EngineRouter(self.primary))
+
+        assert client.get("/read").json()["db"] == "primary"
+        response = client.post("/write?status=201")
+        assert "set-cookie" not in response.headers
@@ -0,0 +1,128 @@
+import asyncio
+import inspect
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import IsolatedAsyncioTestCase
+
+from ..jobs import JobQueue, MemoryJobStore, SQLiteJobStore, make_job_store
+
+
+async def wait_until(condition, timeout=2):
+    # `condition` returns a bool or a coroutine of it
+    deadline = time() + timeout
+    while time() < deadline:
+        met = condition()
+        if inspect.isawaitable(met):
+            met = await met
+        if met:
+            return
+        await asyncio.sleep(0.005)
+
+
+async def stat(queue, name):
+    return (await queue.stats())[name]
+
+
+def make_queue(store=None, **kwargs):
+    queue = JobQueue(
+        store or MemoryJobStore(), max_attempts=3, retry_delay=0.01, **kwargs
+    )
+    done = []
+
+    @queue.handler("record")
+    async def record(value):
+        done.append(value)
+
+    return queue, done
+
+
+class TestJobQueue(IsolatedAsyncioTestCase):
+    async def test_workers_run_the_enqueued_jobs(self):
+        queue, done = make_queue(workers=2)
+        queue.start()
+
+        for value in range(5):
+            await queue.enqueue("record", value=value)
+        await wait_until(lambda: len(done) == 5)
+        await queue.stop()
+
+        assert sorted(done) == [0, 1, 2, 3, 4]
+        stats = await queue.stats()
+        assert stats["enqueued"] == stats["done"] == 5
+        assert stats["depth"] == 0
+
+    async def test_failed_jobs_are_retried_then_given_up(self):
+        queue, done = make_queue()
+        attempts = []
+
+        @queue.handler("flaky")
+        async def flaky(fail_times):
+            attempts.append(time())
+            if len(attempts) <= fail_times:
+                raise ConnectionError("try again")
+
+        queue.start()
+        await queue.enqueue("flaky", fail_times=1)
+        await wait_until(lambda: queue.counts["done"] == 1)
+        assert len(attempts) == 2
+        # the retry waited (retry_delay) after the failure
+        assert attempts[1] - attempts[0] >= 0.01
+
+        attempts.clear()
+        await queue.enqueue("flaky", fail_times=10)
+        await queue.enqueue("missing handler")
+
+        async def both_failed():
+            return await stat(queue, "failed") == 2
+
+        await wait_until(both_failed)
+        await queue.stop()
+
+        assert len(attempts) == 3
+        stats = await queue.stats()
+        assert stats["retried"] == 1 + 2 + 2
+        assert stats["failed"] == 2
+        assert stats["depth"] == 0
+
+    async def test_stopping_runs_the_due_jobs_of_the_memory_store(self):
+        queue, done = make_queue()
+
+        await queue.enqueue("record", value="before start")
+        queue.start()
+        await queue.stop()
+
+        assert done == ["before start"]
+
+
+class TestSQLiteJobStore(IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/jobs.db"
+
+    async def test_jobs_outlive_the_worker(self):
+        queue, _ = make_queue(make_job_store("sqlite", self.path))
+        await queue.enqueue("record", value={"id": 1})
+        await queue.stop()
+
+        # another worker (process) on the same file
+        queue, done = make_queue(SQLiteJobStore(self.path))
+        assert await stat(queue, "depth") == 1
+        await queue.run_pending()
+
+        assert done == [{"id": 1}]
+        assert await stat(queue, "depth") == 0
+
+    async def test_taken_job_is_locked_until_it_is_done_or_times_out(self):
+        store = SQLiteJobStore(self.path)
+        await store.put("record", {"value": 1}, time())
+
+        now = time()
+        job = await store.take(now, lock_seconds=10)
+        assert job.payload == {"value": 1}
+        assert await store.take(now, lock_seconds=10) is None
+        # its worker has crashed
+        assert await store.take(now + 11, lock_seconds=10) == job
+
+        await store.retry(job, 1, now, "error")
+        assert (await store.take(now, lock_seconds=10)).attempts == 1
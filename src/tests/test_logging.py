@@ -0,0 +1,116 @@
+import json
+import logging
+import queue
+from unittest import TestCase
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from ..helpers import (
+    BackgroundHandler,
+    JSONFormatter,
+    RequestIdMiddleware,
+    SamplingFilter,
+    log_stats,
+    parse_rates,
+    request_id,
+)
+
+
+def make_logger(name, queue_size=10, rates=None):
+    records = queue.Queue(queue_size)
+    handler = BackgroundHandler(records)
+    handler.addFilter(SamplingFilter(rates or {}))
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, records
+
+
+def logged(records):
+    lines = []
+    while not records.empty():
+        lines.append(json.loads(JSONFormatter().format(records.get_nowait())))
+    return lines
+
+
+class TestLogging(TestCase):
+    def test_records_are_json_with_the_request_id(self):
+        logger, records = make_logger("test.json")
+        token = request_id.set("abc123")
+        try:
+            values = [1]
+            logger.info("Report %d of %s", 7, values, extra={"reports": 3})
+            # the message is formatted before the record is queued
+            values.append(2)
+            try:
+                raise ValueError("wrong")
+            except ValueError:
+                logger.exception("Failed")
+        finally:
+            request_id.reset(token)
+        logger.info("Outside of a request")
+
+        info, error, outside = logged(records)
+        assert info["message"] == "Report 7 of [1]"
+        assert info["level"] == "INFO"
+        assert info["logger"] == "test.json"
+        assert info["request_id"] == "abc123"
+        assert info["reports"] == 3
+        assert "exception" not in info
+        assert error["level"] == "ERROR"
+        assert "ValueError: wrong" in error["exception"]
+        assert "request_id" not in outside
+
+    def test_records_below_warning_are_sampled_by_logger(self):
+        logger, records = make_logger(
+            "test.sampled", rates=parse_rates("test.sampled.noisy=0, other=1")
+        )
+        sampled_out = log_stats["sampled_out"]
+
+        logger.getChild("noisy").info("dropped")
+        logger.getChild("noisy.child").debug("dropped too")
+        logger.getChild("noisy").warning("kept")
+        logger.getChild("quiet").info("kept too")
+
+        assert [line["message"] for line in logged(records)] == ["kept", "kept too"]
+        assert log_stats["sampled_out"] == sampled_out + 2
+
+    def test_records_are_dropped_when_the_queue_is_full(self):
+        logger, records = make_logger("test.full", queue_size=2)
+        dropped = log_stats["dropped"]
+
+        for number in range(5):
+            logger.info("Record %d", number)
+
+        assert [line["message"] for line in logged(records)] == ["Record 0", "Record 1"]
+        assert log_stats["dropped"] == dropped + 3
+
+
+async def current_request_id(request):
+    return JSONResponse({"request_id": request_id.get()})
+
+
+class TestRequestIdMiddleware(TestCase):
+    def setUp(self):
+        app = Starlette(routes=[Route("/", current_request_id)])
+        app.add_middleware(RequestIdMiddleware)
+        self.client = TestClient(app)
+
+    def test_client_request_id_is_used(self):
+        response = self.client.get("/", headers={"X-Request-ID": "client-42"})
+
+        assert response.headers["x-request-id"] == "client-42"
+        assert response.json() == {"request_id": "client-42"}
+        assert request_id.get() is None
+
+    def test_new_one_without_a_valid_one(self):
+        for headers in ({}, {"X-Request-ID": "not <an> ID"}):
+            response = self.client.get("/", headers=headers)
+
+            generated = response.headers["x-request-id"]
+            assert len(generated) == 32
+            assert response.json() == {"request_id": generated}
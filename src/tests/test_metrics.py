@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from ..metrics import Histogram, RequestStats, current_request, record_query
+
+
+class TestHistogram(TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("latency", "Latency.", (0.1, 1), ("route",))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, "/api/reports")
+
+        assert histogram.render().splitlines() == [
+            "# HELP latency Latency.",
+            "# TYPE latency histogram",
+            'latency_bucket{route="/api/reports",le="0.1"} 2',
+            'latency_bucket{route="/api/reports",le="1"} 3',
+            'latency_bucket{route="/api/reports",le="+Inf"} 4',
+            'latency_sum{route="/api/reports"} 2.65',
+            'latency_count{route="/api/reports"} 4',
+        ]
+
+
+class TestRecordQuery(TestCase):
+    def test_queries_are_added_to_the_current_request(self):
+        record_query(1.0)  # outside of a request, ignored
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            record_query(0.25)
+            record_query(0.5)
+        finally:
+            current_request.reset(token)
+
+        assert stats.queries == 2
+        assert stats.db_seconds == 0.75
@@ -0,0 +1,67 @@
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from alembic import command
+from alembic.config import Config
+
+from ..models import User
+from ..routers.api import get_reports, report_projection
+
+ALEMBIC_DIRECTORY = Path(__file__).parents[2] / "alembic"
+
+
+def alembic_config(path):
+    # without the ini file, so the logging stays as it is
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIRECTORY))
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    return config
+
+
+class TestMigrations(IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/migrated.db"
+        self.config = alembic_config(self.path)
+
+    async def test_reports_without_date_updated_are_listed_with_cursors(self):
+        # the first revision had date_updated nullable
+        command.upgrade(self.config, "51ec8995a648")
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "INSERT INTO report (id, status, date_created, date_updated) VALUES"
+                " (1, 'draft', '2025-01-01 10:00:00', NULL),"
+                " (2, 'draft', '2025-01-02 10:00:00', '2025-01-03 10:00:00'),"
+                " (3, 'draft', '2025-01-04 10:00:00', NULL)"
+            )
+        command.upgrade(self.config, "head")
+
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.path}", poolclass=NullPool
+        )
+        listed = []
+        cursor = ""
+        async with AsyncSession(engine) as session:
+            while cursor is not None:
+                page = await get_reports(
+                    session=session,
+                    current_user=User(id=1, username="johndoe", hashed_password="***"),
+                    limit=1,
+                    cursor=cursor,
+                    # (the reporter table hasn't got all the model's columns)
+                    projection=report_projection("status", None),
+                )
+                page = json.loads(page.body)
+                listed += [report["id"] for report in page["items"]]
+                cursor = page["next_cursor"]
+        await engine.dispose()
+
+        assert listed == [3, 2, 1]
@@ -1,12 +1,22 @@
+import asyncio
 import datetime
+import json
+import sqlite3
+from contextlib import contextmanager
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, mock
+
 import freezegun
-from sqlmodel import SQLModel, create_engine
-from sqlalchemy import MetaData
+from fastapi import HTTPException
+from sqlmodel import SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+from sqlalchemy import MetaData, event, true
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
-from unittest import IsolatedAsyncioTestCase
-
-from .data.db_test_data import (diseases, patients, reporters, reports)
+from sqlalchemy.pool import NullPool
 
+from .data.db_test_data import diseases, patients, reporters, reports
 from ..models import (
     Disease,
     DiseaseBase,
@@ -16,6 +26,7 @@ from ..models import (
     PatientBase,
     Report,
     ReportBase,
+    ReportRollup,
     ReportStatus,
     Reporter,
     ReporterBase,
@@ -23,17 +34,42 @@ from ..models import (
     TreatmentStatus,
     User,
 )
+from ..constants import MAX_PAGE_SIZE
+from ..db import EngineRouter
+from .. import dependencies
+from .. import search as full_text
+from ..dependencies import get_current_user, response_cache
+from ..helpers import request_id
+from ..jobs import job_queue
+from ..rollup import count_reports, rebuild
+from ..routers import api
+from ..routers.auth import create_access_token
 from ..routers.api import (
     create_disease,
     create_patient,
     create_report,
     create_reporter,
+    create_reports_bulk,
+    delete_report,
+    export_reports,
+    get_disease,
+    get_patient,
+    get_recent,
+    get_stats,
+    get_report,
+    get_reports,
+    report_projection,
+    search,
     update_report,
 )
 
 engine = create_engine("sqlite:///testdatabase.db", echo=True)
 Session = sessionmaker(bind=engine)
 session = Session()
+# every test runs in its own event loop, so don't keep aiosqlite connections around
+async_engine = create_async_engine(
+    "sqlite+aiosqlite:///testdatabase.db", echo=True, poolclass=NullPool
+)
 
 date_created = (
     datetime.datetime.fromisoformat("2025-09-10T02:02:02.1234567Z").replace(tzinfo=None)
@@ -111,6 +147,84 @@ def create_db():
     SQLModel.metadata.create_all(engine)
 
 
+@contextmanager
+def count_queries(with_parameters=False):
+    """
+    Counts SQL statements sent to the (test) database inside the block
+    (collects them, with their parameters if asked).
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters) if with_parameters else statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(
+            async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+        )
+
+
+def query_plan(statement, parameters):
+    """
+    The steps of SQLite's plan for the statement (EXPLAIN QUERY PLAN).
+    """
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in rows]
+
+
+def make_request(body: bytes, content_type: str):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", content_type.encode())],
+    }
+    return Request(scope, receive)
+
+
+def request_with_headers(headers: dict[str, str], method: str = "GET"):
+    scope = {
+        "type": "http",
+        "method": method,
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+    }
+    return Request(scope)
+
+
+async def add_report_graph(session, id, **report_data):
+    """
+    Adds a report with its own reporter, patient and disease (all with the same ID).
+    """
+    session.add_all([
+        Reporter(**{
+            **reporter_01,
+            "id": id,
+            "username": f"reporter{id}",
+            "email": f"reporter{id}@email.com",
+        }),
+        Patient(**{**patient_01, "id": id, "medical_record_number": id}),
+        Disease(**{**disease_01, "id": id}),
+    ])
+    await session.flush()
+    session.add(
+        Report(**{
+            **report_01,
+            "id": id,
+            "reporter_id": id,
+            "patient_id": id,
+            "disease_id": id,
+            **report_data,
+        })
+    )
+    await session.commit()
+
+
 class TestAPIEndpoints(IsolatedAsyncioTestCase):
     """
     The class to test endpoints (integration tests)
@@ -143,6 +257,13 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
         self.report = Report(**reports[0])
         self.reporter = Reporter(**reporters[0])
 
+    async def asyncSetUp(self):
+        await response_cache.clear()
+        self.session = AsyncSession(async_engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+
     @freezegun.freeze_time("2025-05-05")
     async def test_freeze_time(self):
         assert datetime.date.fromisoformat("2025-05-05") == datetime.date.today()
@@ -151,8 +272,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_creating_disease(self):
         results = await create_disease(
             id=1000,
+            request=request_with_headers({}, "POST"),
             disease=DiseaseBase(**disease_01),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -175,8 +297,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_modifying_disease(self):
         results = await create_disease(
             id=1000,
+            request=request_with_headers({}, "POST"),
             disease=DiseaseBase(**{**disease_01, "lab_results": "still nothing"}),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -203,8 +326,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_creating_patient(self):
         results = await create_patient(
             id=1000,
+            request=request_with_headers({}, "POST"),
             patient=PatientBase(**patient_01),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -222,8 +346,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_modifying_patient(self):
         results = await create_patient(
             id=1000,
+            request=request_with_headers({}, "POST"),
             patient=PatientBase(**{**patient_01, "last_name": "IDK"}),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -242,8 +367,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_creating_reporter(self):
         results = await create_reporter(
             id=1000,
+            request=request_with_headers({}, "POST"),
             reporter=ReporterBase(**reporter_01),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -261,8 +387,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_modifying_reporter(self):
         results = await create_reporter(
             id=1000,
+            request=request_with_headers({}, "POST"),
             reporter=ReporterBase(**{**reporter_01, "last_name": "IDK"}),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -280,7 +407,7 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_creating_report(self):
         results = await create_report(
             report=ReportBase(**report_01),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -296,8 +423,9 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
     async def test_modifying_report(self):
         results = await update_report(
             id=1,
+            request=request_with_headers({}, "PUT"),
             report=ReportBase(**{**report_01, "status": ReportStatus.approved}),
-            session=session,
+            session=self.session,
             current_user=self.current_user,
         )
 
@@ -315,6 +443,773 @@ class TestAPIEndpoints(IsolatedAsyncioTestCase):
         assert results.reporter_id == report_01["reporter_id"]
         assert results.id == 1000
 
+    async def test_getting_report_in_single_query(self):
+        await add_report_graph(self.session, 2000)
+        self.session.expunge_all()
+
+        with count_queries() as statements:
+            results = await get_report(
+                id=2000,
+                request=request_with_headers({}),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        assert len(statements) == 1
+        results = json.loads(results.body)
+        assert results["id"] == 2000
+        assert results["reporter"]["username"] == "reporter2000"
+        assert results["patient"]["medical_record_number"] == 2000
+        assert results["disease"]["name"] == disease_01["name"]
+
+    async def test_getting_report_from_cache(self):
+        await add_report_graph(self.session, 2070)
+        self.session.expunge_all()
+
+        async def get():
+            response = await get_report(
+                id=2070,
+                request=request_with_headers({}),
+                session=self.session,
+                current_user=self.current_user,
+            )
+            return json.loads(response.body)
+
+        await get()
+        with count_queries() as statements:
+            report = await get()
+        assert statements == []
+        assert report["patient"]["emergency_contact"] == patient_01["emergency_contact"]
+
+        # the patient is part of the report, its update drops the cached report
+        await create_patient(
+            id=2070,
+            patient=PatientBase(**{
+                **patient_01,
+                "medical_record_number": 2070,
+                "emergency_contact": "changed",
+            }),
+            request=request_with_headers({}, "POST"),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        self.session.expunge_all()
+        report = await get()
+        assert report["patient"]["emergency_contact"] == "changed"
+
+        await update_report(
+            id=2070,
+            request=request_with_headers({}, "PUT"),
+            report=ReportBase(status=ReportStatus.submitted),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        self.session.expunge_all()
+        report = await get()
+        assert report["status"] == ReportStatus.submitted.value
+
+    async def test_lagging_replica_reads_are_not_cached(self):
+        await add_report_graph(self.session, 2130)
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # the replica hasn't got the update below yet
+        with (
+            sqlite3.connect("testdatabase.db") as primary,
+            sqlite3.connect(f"{directory.name}/replica.db") as replica,
+        ):
+            primary.backup(replica)
+        router = EngineRouter(async_engine, [
+            create_async_engine(
+                f"sqlite+aiosqlite:///{directory.name}/replica.db", poolclass=NullPool
+            )
+        ])
+
+        async def get(router):
+            request = request_with_headers({})
+            async with AsyncSession(router.read_engine(request)) as session:
+                response = await get_patient(
+                    id=2130,
+                    request=request,
+                    session=session,
+                    current_user=self.current_user,
+                )
+            return json.loads(response.body)["emergency_contact"]
+
+        await create_patient(
+            id=2130,
+            patient=PatientBase(**{
+                **patient_01,
+                "medical_record_number": 2130,
+                "emergency_contact": "changed",
+            }),
+            request=request_with_headers({}, "POST"),
+            session=self.session,
+            current_user=self.current_user,
+        )
+
+        assert await get(router) == patient_01["emergency_contact"]
+        assert await response_cache.get("patient:2130") is None
+        # the primary has the update, its reads are cached
+        assert await get(EngineRouter(async_engine)) == "changed"
+        assert await get(router) == "changed"
+
+    async def test_current_user_follows_reporter_updates(self):
+        await add_report_graph(self.session, 2140)
+        token = create_access_token({"sub": "reporter2140"})
+
+        async def current_user():
+            with mock.patch.object(dependencies, "async_engine", async_engine):
+                return await get_current_user(token)
+
+        async def update_reporter(**changes):
+            await create_reporter(
+                id=2140,
+                request=request_with_headers({}, "POST"),
+                reporter=ReporterBase(**{
+                    **reporter_01,
+                    "username": "reporter2140",
+                    "email": "reporter2140@email.com",
+                    "hashed_password": None,
+                    **changes,
+                }),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        user = await current_user()
+        # (from the cache)
+        assert await current_user() is user
+
+        await update_reporter(last_name="Changed")
+        assert (await current_user()).last_name == "Changed"
+
+        # the tokens of the old username stop working
+        await update_reporter(username="reporter2140b")
+        with self.assertRaises(HTTPException):
+            await current_user()
+
+    async def test_writes_are_logged_by_a_job(self):
+        await add_report_graph(self.session, 2150)
+        logged = []
+
+        def info(message, *args):
+            logged.append((message % args, request_id.get()))
+
+        token = request_id.set("write-2150")
+        try:
+            with mock.patch.object(api.logger, "info", info):
+                await create_patient(
+                    id=2150,
+                    patient=PatientBase(**{**patient_01, "medical_record_number": 2150}),
+                    request=request_with_headers({}, "POST"),
+                    session=self.session,
+                    current_user=self.current_user,
+                )
+                message = "Patient of Report 2150 successfully updated"
+                assert message not in [text for text, _ in logged]
+                request_id.set(None)
+
+                await job_queue.run_pending()
+        finally:
+            request_id.reset(token)
+
+        # in the name of the request
+        assert (message, "write-2150") in logged
+
+    async def test_getting_recent_report_in_single_query(self):
+        await add_report_graph(
+            self.session,
+            2001,
+            status=ReportStatus.submitted,
+            date_updated=datetime.datetime(2100, 1, 1),
+        )
+        self.session.expunge_all()
+
+        with count_queries() as statements:
+            results = await get_recent(
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        assert len(statements) == 1
+        results = json.loads(results.body)
+        assert results["id"] == 2001
+        assert results["reporter"]["id"] == 2001
+        assert results["patient"]["id"] == 2001
+        assert results["disease"]["id"] == 2001
+
+    async def test_listing_reports_with_unset_relations(self):
+        await add_report_graph(self.session, 2002)
+        self.session.add(Report(**{
+            **report_01, "id": 2003, "patient_id": None, "disease_id": None
+        }))
+        await self.session.commit()
+        self.session.expunge_all()
+
+        with count_queries() as statements:
+            results = await get_reports(
+                session=self.session,
+                current_user=self.current_user,
+                offset=0,
+                limit=1000,
+            )
+
+        assert len(statements) == 1
+        results = {report["id"]: report for report in json.loads(results.body)}
+        assert results[2002]["patient"]["id"] == 2002
+        assert results[2002]["disease"]["id"] == 2002
+        assert results[2003]["patient"] is None
+        assert results[2003]["disease"] is None
+
+    async def test_listing_reports_with_cursor(self):
+        for id in range(2010, 2015):
+            await add_report_graph(self.session, id)
+        self.session.expunge_all()
+
+        listed = []
+        cursor = ""
+        while cursor is not None:
+            page = await get_reports(
+                session=self.session,
+                current_user=self.current_user,
+                limit=2,
+                cursor=cursor,
+            )
+            page = json.loads(page.body)
+            assert len(page["items"]) <= 2
+            listed += [
+                (datetime.datetime.fromisoformat(report["date_updated"]), report["id"])
+                for report in page["items"]
+            ]
+            cursor = page["next_cursor"]
+
+        # newest first, nothing is listed twice
+        assert listed == sorted(listed, reverse=True)
+        assert len(listed) == len(set(listed))
+        ids = [id for _, id in listed]
+        assert all(id in ids for id in range(2010, 2015))
+
+    async def test_listing_reports_added_with_server_default_dates(self):
+        # the way the reports were added before the Python side defaults
+        # (with CURRENT_TIMESTAMP they had no microseconds)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO report (id, status) VALUES"
+                " (2110, 'draft'), (2111, 'draft'), (2112, 'draft')"
+            )
+
+        listed = []
+        cursor = ""
+        while cursor is not None:
+            page = await get_reports(
+                session=self.session,
+                current_user=self.current_user,
+                limit=1,
+                cursor=cursor,
+            )
+            page = json.loads(page.body)
+            # (the same one again would be listed forever)
+            assert not {report["id"] for report in page["items"]} & set(listed)
+            listed += [report["id"] for report in page["items"]]
+            cursor = page["next_cursor"]
+
+        assert {2110, 2111, 2112} <= set(listed)
+
+    async def test_listing_reports_with_filters(self):
+        await add_report_graph(self.session, 2090)
+        await add_report_graph(self.session, 2091, status=ReportStatus.submitted)
+        self.session.expunge_all()
+
+        async def list_ids(cursor=None, **filters):
+            with count_queries(with_parameters=True) as statements:
+                response = await get_reports(
+                    session=self.session,
+                    current_user=self.current_user,
+                    offset=0,
+                    limit=MAX_PAGE_SIZE,
+                    cursor=cursor,
+                    **filters,
+                )
+            (statement, parameters), = statements
+            plan = query_plan(statement, parameters)
+            # the filtered tables are searched with an index, none is read whole
+            assert not [step for step in plan if step.startswith("SCAN")], plan
+
+            page = json.loads(response.body)
+            items = page if cursor is None else page["items"]
+            return {report["id"] for report in items if report["id"] >= 2090}
+
+        for filters in (
+            {"report_status": ReportStatus.submitted},
+            {"reporter_id": 2091},
+            {"category": DiseaseCategory.bacterial, "reporter_id": 2091},
+            {"severity_level": SeverityLevel.high, "reporter_id": 2091},
+            {"category": DiseaseCategory.bacterial, "severity_level": SeverityLevel.high},
+            {"date_from": report_01["date_created"]},
+            {"date_to": datetime.datetime(2100, 1, 1)},
+        ):
+            assert 2091 in await list_ids(cursor="", **filters)
+            # with the offset too (the first page)
+            await list_ids(**filters)
+
+        assert await list_ids(cursor="", reporter_id=2090) == {2090}
+        assert await list_ids(
+            cursor="", reporter_id=2090, report_status=ReportStatus.submitted
+        ) == set()
+        assert await list_ids(
+            cursor="", category=DiseaseCategory.viral, reporter_id=2090
+        ) == set()
+        assert await list_ids(cursor="", date_to=report_01["date_created"]) == set()
+
+    async def test_getting_report_with_projection(self):
+        await add_report_graph(self.session, 2100)
+        self.session.expunge_all()
+
+        async def get(fields=None, include=None):
+            response = await get_report(
+                id=2100,
+                request=request_with_headers({}),
+                session=self.session,
+                current_user=self.current_user,
+                projection=report_projection(fields, include),
+            )
+            return json.loads(response.body)
+
+        full = await get()
+        with count_queries() as statements:
+            report = await get("status,disease.name,patient.age")
+        assert len(statements) == 1
+        assert report == {
+            "id": 2100,
+            "status": full["status"],
+            "disease": {"id": 2100, "name": full["disease"]["name"]},
+            "patient": {"id": 2100, "age": full["patient"]["age"]},
+        }
+
+        report = await get(include="reporter,disease")
+        assert report.keys() == full.keys() - {"patient"}
+        assert report["disease"] == full["disease"]
+        # the only difference, the password hashes are never returned
+        assert "hashed_password" not in report["reporter"]
+        assert report["reporter"] == {
+            name: value
+            for name, value in full["reporter"].items()
+            if name != "hashed_password"
+        }
+
+        for fields, include in (
+            ("reporter.hashed_password", None),
+            ("status,nope", None),
+            ("disease.nope", None),
+            (None, "status"),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                report_projection(fields, include)
+            assert raised.exception.status_code == 422
+
+    async def test_listing_reports_with_projection(self):
+        await add_report_graph(self.session, 2101)
+        self.session.add(Report(**{**report_01, "id": 2102, "disease_id": None}))
+        await self.session.commit()
+        self.session.expunge_all()
+
+        listed = []
+        cursor = ""
+        while cursor is not None:
+            with count_queries() as statements:
+                page = await get_reports(
+                    session=self.session,
+                    current_user=self.current_user,
+                    limit=2,
+                    cursor=cursor,
+                    reporter_id=report_01["reporter_id"],
+                    projection=report_projection("disease.category", None),
+                )
+            assert len(statements) == 1
+            page = json.loads(page.body)
+            listed += page["items"]
+            cursor = page["next_cursor"]
+
+        assert {"id": 2102, "disease": None} in listed
+        assert all(report.keys() == {"id", "disease"} for report in listed)
+
+        page = await get_reports(
+            session=self.session,
+            current_user=self.current_user,
+            offset=0,
+            limit=MAX_PAGE_SIZE,
+            projection=report_projection(None, "disease"),
+        )
+        reports = {report["id"]: report for report in json.loads(page.body)}
+        assert reports[2101]["disease"]["category"] == disease_01["category"].value
+        assert reports[2101]["status"] == report_01["status"].value
+        assert "reporter" not in reports[2101]
+
+    async def test_creating_reports_in_bulk(self):
+        patient = PatientBase(
+            **{**patient_01, "medical_record_number": 3000}
+        ).model_dump(mode="json")
+        disease = DiseaseBase(**disease_01).model_dump(mode="json")
+        items = [
+            {"report": {"status": "Draft"}, "patient": patient, "disease": disease},
+            {"report": {"status": "Unknown"}},
+            # the same medical record number, only this item is rejected
+            {"report": {"status": "Draft"}, "patient": patient},
+            {"report": {"status": "Submitted", "patient_id": 1}},
+        ]
+        body = "\n".join(json.dumps(item) for item in items)
+
+        results = await create_reports_bulk(
+            request=make_request(body.encode(), "application/x-ndjson"),
+            session=self.session,
+            current_user=self.current_user,
+        )
+
+        assert [result.status_code for result in results] == [201, 422, 400, 201]
+        assert results[1].detail[0]["loc"] == ["report", "status"]
+
+        report = await self.session.get(Report, results[0].report_id)
+        assert report.reporter_id == self.current_user.id
+        assert report.patient_id == results[0].patient_id
+        assert report.disease_id == results[0].disease_id
+        disease = await self.session.get(Disease, results[0].disease_id)
+        assert disease.created_by == self.current_user.id
+        report = await self.session.get(Report, results[3].report_id)
+        assert report.status == ReportStatus.submitted
+        assert report.patient_id == 1
+
+    async def test_creating_reports_in_bulk_with_an_insert_per_table(self):
+        items = [
+            {
+                "report": {"status": "Draft"},
+                "patient": PatientBase(
+                    **{**patient_01, "medical_record_number": 3100 + number}
+                ).model_dump(mode="json"),
+                "disease": DiseaseBase(
+                    **{**disease_01, "name": f"Disease {number}"}
+                ).model_dump(mode="json"),
+            }
+            for number in range(12)
+        ]
+
+        with (
+            mock.patch.object(api, "BULK_CHUNK_SIZE", 5),
+            count_queries() as statements,
+        ):
+            results = await create_reports_bulk(
+                request=make_request(json.dumps(items).encode(), "application/json"),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        inserts = [
+            statement for statement in statements if statement.startswith("INSERT")
+            and not statement.startswith("INSERT INTO report_rollup")
+        ]
+        # patients, diseases and reports of each of the 3 chunks
+        assert len(inserts) == 3 * 3
+        # (and the rollup's count and update)
+        assert len(statements) <= 3 * 5
+        for number, result in enumerate(results):
+            report = await self.session.get(Report, result.report_id)
+            patient = await self.session.get(Patient, result.patient_id)
+            disease = await self.session.get(Disease, result.disease_id)
+            assert (report.patient_id, report.disease_id) == (patient.id, disease.id)
+            assert patient.medical_record_number == 3100 + number
+            assert disease.name == f"Disease {number}"
+
+    async def test_exporting_reports(self):
+        date_from = datetime.datetime(2030, 1, 1)
+        statuses = [ReportStatus.draft, ReportStatus.submitted, ReportStatus.submitted]
+        for id, status in enumerate(statuses, 2020):
+            await add_report_graph(
+                self.session, id, status=status, date_created=date_from
+            )
+
+        async def export(**params):
+            response = await export_reports(
+                session=self.session,
+                current_user=self.current_user,
+                date_from=date_from,
+                **params,
+            )
+            return "".join([chunk async for chunk in response.body_iterator])
+
+        rows = [json.loads(line) for line in (await export()).splitlines()]
+        assert [row["id"] for row in rows] == [2020, 2021, 2022]
+        assert rows[0]["status"] == ReportStatus.draft.value
+        assert rows[0]["organization_name"] == reporter_01["organization_name"]
+        assert rows[0]["disease_name"] == disease_01["name"]
+
+        csv = await export(export_format="csv", report_status=ReportStatus.submitted)
+        lines = csv.splitlines()
+        assert lines[0].startswith("id,status,")
+        assert [line.split(",")[0] for line in lines[1:]] == ["2021", "2022"]
+
+    async def test_searching_diseases(self):
+        for id, symptoms, lab_results in (
+            (2080, "Xanthopsia and wheezing", "TBA"),
+            (2081, "xanthopsia", "xanthopsia confirmed"),
+        ):
+            await add_report_graph(self.session, id)
+            # the index follows the updates
+            await create_disease(
+                id=id,
+                request=request_with_headers({}, "POST"),
+                disease=DiseaseBase(**{
+                    **disease_01, "symptoms": symptoms, "lab_results": lab_results
+                }),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        async def find(q, **kwargs):
+            response = await search(
+                session=self.session,
+                current_user=self.current_user,
+                q=q,
+                **{"offset": 0, "limit": 20, **kwargs},
+            )
+            return json.loads(response.body)
+
+        page = await find("XANTHOPSIA")
+        # more matches rank higher
+        assert [hit["disease_id"] for hit in page["items"]] == [2081, 2080]
+        assert page["items"][0]["report_ids"] == [2081]
+        assert page["items"][0]["lab_results"] == "<mark>xanthopsia</mark> confirmed"
+
+        page = await find("xanthopsia wheeze")
+        assert [hit["disease_id"] for hit in page["items"]] == [2080]
+        assert page["items"][0]["symptoms"] == (
+            "<mark>Xanthopsia</mark> and <mark>wheezing</mark>"
+        )
+
+        page = await find("xanth*", limit=1)
+        assert len(page["items"]) == 1
+        assert page["next_offset"] == 1
+        page = await find("xanth*", offset=1, limit=1)
+        assert page["next_offset"] is None
+
+        # FTS5 syntax is searched as text
+        assert (await find('xanthopsia OR "'))["items"] == []
+
+    async def test_searching_diseases_past_the_ranked_ones(self):
+        for id, symptoms in (
+            (2120, "zymosis"),
+            (2121, "zymosis"),
+            (2122, "zymosis"),
+            (2123, "zymosis zymosis zymosis"),
+            (2124, "zymosis and a long list of other symptoms"),
+        ):
+            await add_report_graph(self.session, id)
+            await create_disease(
+                id=id,
+                request=request_with_headers({}, "POST"),
+                disease=DiseaseBase(**{**disease_01, "symptoms": symptoms}),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        async def find(offset, limit):
+            response = await search(
+                session=self.session,
+                current_user=self.current_user,
+                q="zymosis",
+                offset=offset,
+                limit=limit,
+            )
+            page = json.loads(response.body)
+            return [hit["disease_id"] for hit in page["items"]], page["next_offset"]
+
+        with mock.patch.object(full_text, "SEARCH_RANK_WINDOW", 2):
+            # the newest two by rank, then the older ones newest first
+            assert await find(0, 2) == ([2123, 2124], 2)
+            assert await find(2, 2) == ([2122, 2121], 4)
+            assert await find(4, 2) == ([2120], None)
+            assert await find(1, 3) == ([2124, 2122, 2121], 4)
+            assert await find(0, 5) == ([2123, 2124, 2122, 2121, 2120], None)
+
+    async def test_getting_stats(self):
+        date_from = datetime.datetime(2031, 1, 1)
+        statuses = [ReportStatus.draft, ReportStatus.approved, ReportStatus.draft]
+        for id, status in enumerate(statuses, 2030):
+            await add_report_graph(
+                self.session, id, status=status, date_created=date_from
+            )
+
+        stats = await get_stats(
+            session=self.session,
+            current_user=self.current_user,
+            organization=reporter_01["organization_name"],
+            period="week",
+            date_from=date_from,
+        )
+
+        assert stats.total == 3
+        assert stats.by_category == [(DiseaseCategory.bacterial, 3)]
+        assert stats.by_severity == [(SeverityLevel.high, 3)]
+        assert stats.by_status == [(ReportStatus.approved, 1), (ReportStatus.draft, 2)]
+        # detected on Friday 2025-06-06
+        assert stats.by_period == [("2025-06-02", 3)]
+
+        stats = await get_stats(
+            session=self.session,
+            current_user=self.current_user,
+            organization="nobody",
+            date_from=date_from,
+        )
+        assert stats.total == 0
+        assert stats.by_period == []
+
+    async def test_rollup_follows_report_changes(self):
+        await add_report_graph(self.session, 2040)
+        self.session.expunge_all()
+        await rebuild(self.session)
+
+        async def assert_rollup_is_up_to_date():
+            rows = await self.session.exec(select(ReportRollup))
+            rollup = {
+                (row.day, row.category, row.severity_level, row.status): row.count
+                for row in rows
+            }
+            assert rollup == await count_reports(self.session, true())
+
+        report = await create_report(
+            report=ReportBase(status=ReportStatus.draft, disease_id=2040),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        await assert_rollup_is_up_to_date()
+
+        await update_report(
+            id=report.id,
+            request=request_with_headers({}, "PUT"),
+            report=ReportBase(status=ReportStatus.submitted, disease_id=None),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        await assert_rollup_is_up_to_date()
+
+        await update_report(
+            id=report.id,
+            request=request_with_headers({}, "PUT"),
+            report=ReportBase(status=ReportStatus.draft, disease_id=2040),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        await delete_report(id=report.id, session=self.session)
+        await assert_rollup_is_up_to_date()
+
+        await create_disease(
+            id=2040,
+            request=request_with_headers({}, "POST"),
+            disease=DiseaseBase(**{**disease_01, "category": DiseaseCategory.viral}),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        await assert_rollup_is_up_to_date()
+
+
+    async def test_getting_report_not_modified(self):
+        await add_report_graph(self.session, 2050)
+        self.session.expunge_all()
+
+        async def get(headers):
+            return await get_report(
+                id=2050,
+                request=request_with_headers(headers),
+                session=self.session,
+                current_user=self.current_user,
+            )
+
+        etag = (await get({})).headers["etag"]
+        assert etag.startswith('W/"')
+
+        cached = await get({"if-none-match": etag})
+        assert cached.status_code == 304
+        assert cached.body == b""
+        assert cached.headers["etag"] == etag
+
+        await update_report(
+            id=2050,
+            request=request_with_headers({}, "PUT"),
+            report=ReportBase(status=ReportStatus.submitted),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        self.session.expunge_all()
+        response = await get({"if-none-match": etag})
+        assert json.loads(response.body)["status"] == ReportStatus.submitted.value
+        assert response.headers["etag"] != etag
+
+    async def test_getting_disease_not_modified_since(self):
+        await add_report_graph(self.session, 2051)
+        self.session.expunge_all()
+
+        response = await get_disease(
+            id=2051,
+            request=request_with_headers({}),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        cached = await get_disease(
+            id=2051,
+            request=request_with_headers(
+                {"if-modified-since": response.headers["last-modified"]}
+            ),
+            session=self.session,
+            current_user=self.current_user,
+        )
+        assert cached.status_code == 304
+
+
+    async def test_parallel_updates_are_not_lost(self):
+        await add_report_graph(self.session, 2060)
+        self.session.expunge_all()
+        response = await get_patient(
+            id=2060,
+            request=request_with_headers({}),
+            session=self.session,
+            current_user=self.current_user,
+        )
+
+        async def update(contact, headers):
+            patient = PatientBase(**{
+                **patient_01,
+                "medical_record_number": 2060,
+                "emergency_contact": contact,
+            })
+            # every request has its own session
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                try:
+                    await create_patient(
+                        id=2060,
+                        patient=patient,
+                        request=request_with_headers(headers, "POST"),
+                        session=session,
+                        current_user=self.current_user,
+                    )
+                except HTTPException as err:
+                    assert err.status_code == 412
+                    return None
+            return contact
+
+        # all of them were read at the same version, only one can win
+        if_match = {"if-match": response.headers["etag"]}
+        saved = await asyncio.gather(*(update(f"c{i}", if_match) for i in range(5)))
+        saved = [contact for contact in saved if contact]
+        assert len(saved) == 1
+        patient = await self.session.get(Patient, 2060)
+        assert (patient.version, patient.emergency_contact) == (2, saved[0])
+
+        # without If-Match, every update that went through is counted in the version
+        self.session.expunge_all()
+        saved = await asyncio.gather(*(update(f"d{i}", {}) for i in range(5)))
+        saved = [contact for contact in saved if contact]
+        patient = await self.session.get(Patient, 2060)
+        assert patient.version == 2 + len(saved)
+        assert patient.emergency_contact in saved
+
 
 try:
     # Create connection to the database